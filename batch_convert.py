@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import argparse
+import glob
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from convert_to_word import WRITER_BACKENDS, make_writer, markdown_to_word
+from docx_template import load_template_bytes
+from section_cache import DEFAULT_CACHE_DIR, DEFAULT_MAX_ENTRIES, SectionCache
+
+DEFAULT_PATTERNS = ['docs/*.md', 'README.md', 'Project_Proposal_Feature_Flag_Management.md']
+
+
+def expand_patterns(patterns):
+    # Mở rộng glob, bỏ trùng lặp nhưng giữ nguyên thứ tự
+    files = []
+    seen = set()
+    for pattern in patterns:
+        for path in sorted(glob.glob(pattern, recursive=True)):
+            path = os.path.normpath(path)
+            if path not in seen and os.path.isfile(path):
+                seen.add(path)
+                files.append(path)
+    return files
+
+
+def output_path(md_file, out_dir=None):
+    base = os.path.splitext(md_file)[0] + '.docx'
+    if out_dir is None:
+        return base
+    # Giữ cấu trúc thư mục tương đối; file nằm ngoài thư mục hiện tại chỉ giữ tên
+    rel = os.path.relpath(base)
+    if rel.startswith(os.pardir):
+        rel = os.path.basename(base)
+    return os.path.join(out_dir, rel)
+
+
+def convert_one(md_file, docx_file, cache_dir=None, cache_size=DEFAULT_MAX_ENTRIES, backend='docx'):
+    # Chạy trong process worker: chuyển một file và đo thời gian
+    start = time.perf_counter()
+    writer = None
+    try:
+        os.makedirs(os.path.dirname(docx_file) or '.', exist_ok=True)
+        cache = SectionCache(cache_dir, cache_size) if cache_dir else None
+        writer = make_writer(backend, docx_file)
+        markdown_to_word(md_file, docx_file, writer=writer, cache=cache)
+        error = None
+    except Exception as e:
+        # Không để lại file tạm hay .docx hỏng; bản đã có trước đó được giữ nguyên
+        if writer is not None:
+            writer.abort()
+        error = f'{type(e).__name__}: {e}'
+    return {
+        'source': md_file,
+        'output': docx_file,
+        'seconds': round(time.perf_counter() - start, 4),
+        'error': error,
+    }
+
+
+def convert_batch(files, out_dir=None, workers=None, cache_dir=None, cache_size=DEFAULT_MAX_ENTRIES, backend='docx'):
+    workers = workers or os.cpu_count() or 1
+    start = time.perf_counter()
+
+    # Sinh template trước khi tạo pool để các worker không ghi đè lẫn nhau
+    load_template_bytes()
+    with ProcessPoolExecutor(max_workers=workers, initializer=load_template_bytes) as executor:
+        futures = [
+            executor.submit(convert_one, md_file, output_path(md_file, out_dir), cache_dir, cache_size, backend)
+            for md_file in files
+        ]
+        results = [future.result() for future in futures]
+
+    return {
+        'workers': workers,
+        'wallSeconds': round(time.perf_counter() - start, 4),
+        'totalFiles': len(results),
+        'failed': sum(1 for r in results if r['error']),
+        'files': results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Chuyển nhiều file Markdown sang Word song song')
+    parser.add_argument('patterns', nargs='*', default=DEFAULT_PATTERNS, help='Glob của các file Markdown')
+    parser.add_argument('-o', '--out-dir', help='Thư mục chứa file .docx (mặc định: cạnh file nguồn)')
+    parser.add_argument('-j', '--workers', type=int, help='Số process worker (mặc định: số CPU)')
+    parser.add_argument('--summary', default='batch_summary.json', help='File JSON tổng kết')
+    parser.add_argument('--writer', choices=WRITER_BACKENDS, default='docx')
+    parser.add_argument('--incremental', action='store_true', help='Dùng lại các section không thay đổi từ cache')
+    parser.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR)
+    parser.add_argument('--cache-size', type=int, default=DEFAULT_MAX_ENTRIES)
+    args = parser.parse_args()
+
+    files = expand_patterns(args.patterns)
+    if not files:
+        print("Không tìm thấy file Markdown nào")
+        return 1
+
+    cache_dir = args.cache_dir if args.incremental else None
+    summary = convert_batch(files, args.out_dir, args.workers, cache_dir, args.cache_size, args.writer)
+
+    with open(args.summary, 'w', encoding='utf-8') as f:
+        json.dump(summary, f, ensure_ascii=False, indent=2)
+
+    for result in summary['files']:
+        if result['error']:
+            print(f"❌ {result['source']}: {result['error']}")
+    print(f"Đã chuyển {summary['totalFiles'] - summary['failed']}/{summary['totalFiles']} file "
+          f"trong {summary['wallSeconds']}s với {summary['workers']} worker")
+    print(f"Tổng kết: {args.summary}")
+    return 1 if summary['failed'] else 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
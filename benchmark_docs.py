@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import random
+import resource
+import subprocess
+import tempfile
+import time
+
+DEFAULT_SIZES = ['1KB', '1MB', '50MB']
+SIZE_UNITS = {'KB': 1024, 'MB': 1024 ** 2, 'GB': 1024 ** 3}
+
+WORDS = ('feature', 'flag', 'rollout', 'variant', 'người dùng', 'cấu hình', 'AppConfig',
+         'CloudWatch', 'targeting', 'percentage', 'metrics', 'rollback', 'cache', 'nhóm')
+
+
+def parse_size(text):
+    text = text.strip().upper()
+    for unit, factor in SIZE_UNITS.items():
+        if text.endswith(unit):
+            return int(float(text[:-len(unit)]) * factor)
+    return int(text)
+
+
+def _sentence(rng, words=12, bold=True):
+    parts = [rng.choice(WORDS) for _ in range(words)]
+    if bold:
+        # Bold dày đặc: khoảng 1/4 số từ
+        for i in range(0, words, 4):
+            parts[i] = f'**{parts[i]}**'
+    return ' '.join(parts)
+
+
+def _synthetic_blocks(rng):
+    # Sinh vô hạn các block Markdown đủ loại
+    section = 0
+    while True:
+        section += 1
+        yield f'## {section}. {_sentence(rng, 4, bold=False)}\n\n'
+        yield f'### {section}.1. {_sentence(rng, 3)}\n\n'
+        yield _sentence(rng, 40) + '\n\n'
+        for depth in range(6):
+            yield '  ' * depth + f'- {_sentence(rng, 10)}\n'
+        yield '\n'
+        for i in range(1, 6):
+            yield f'{i}. {_sentence(rng, 8)}\n'
+        yield '\n```json\n'
+        for i in range(8):
+            yield f'{{"flag": "flag-{section}-{i}", "enabled": true, "rolloutPercentage": {rng.randint(0, 100)}}}\n'
+        yield '```\n\n'
+        yield '| Flag | Environment | Rollout | Owner |\n|------|-------------|---------|-------|\n'
+        for i in range(10):
+            yield f'| flag-{section}-{i} | prod | {rng.randint(0, 100)}% | **team-{i}** |\n'
+        yield '\n'
+
+
+def generate_markdown(path, size, seed=42):
+    # Ghi file Markdown tổng hợp có kích thước xấp xỉ size byte
+    rng = random.Random(seed)
+    written = 0
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('# Synthetic Feature Flag Runbook\n\n')
+        for block in _synthetic_blocks(rng):
+            if written >= size:
+                break
+            f.write(block)
+            written += len(block.encode('utf-8'))
+    return os.path.getsize(path)
+
+
+class PhaseTimer:
+    def __init__(self):
+        self.phases = {}
+
+    def add(self, name, seconds):
+        self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    def timed_iter(self, name, iterable):
+        # Chỉ cộng thời gian nằm trong next() của iterator (vd. thời gian parse)
+        it = iter(iterable)
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(it)
+            except StopIteration:
+                self.add(name, time.perf_counter() - start)
+                return
+            self.add(name, time.perf_counter() - start)
+            yield item
+
+
+def _peak_rss_kb():
+    # ru_maxrss trên Linux tính bằng KB
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def bench_markdown_to_word(md_file, docx_file, backend='docx'):
+    from convert_to_word import iter_blocks, make_writer
+
+    timer = PhaseTimer()
+    start = time.perf_counter()
+
+    t = time.perf_counter()
+    writer = make_writer(backend, docx_file)
+    timer.add('styleSetup', time.perf_counter() - t)
+
+    t = time.perf_counter()
+    with open(md_file, 'r', encoding='utf-8') as f:
+        writer.write_all(timer.timed_iter('parse', iter_blocks(f)))
+    timer.add('emit', time.perf_counter() - t - timer.phases.get('parse', 0.0))
+
+    t = time.perf_counter()
+    writer.save(docx_file)
+    timer.add('save', time.perf_counter() - t)
+
+    return timer.phases, time.perf_counter() - start
+
+
+def bench_create_project_proposal(spec_file, docx_file, backend=None):
+    from create_word_doc import SpecRenderer, load_spec
+    from docx_template import new_document
+
+    timer = PhaseTimer()
+    start = time.perf_counter()
+
+    t = time.perf_counter()
+    spec = load_spec(spec_file)
+    timer.add('parse', time.perf_counter() - t)
+
+    t = time.perf_counter()
+    doc = new_document()
+    timer.add('styleSetup', time.perf_counter() - t)
+
+    t = time.perf_counter()
+    SpecRenderer(doc).render(spec['blocks'])
+    timer.add('emit', time.perf_counter() - t)
+
+    t = time.perf_counter()
+    doc.save(docx_file)
+    timer.add('save', time.perf_counter() - t)
+
+    return timer.phases, time.perf_counter() - start
+
+
+BENCHMARKS = {
+    'markdown_to_word': bench_markdown_to_word,
+    'create_project_proposal': bench_create_project_proposal,
+}
+
+
+def _run_case(name, source, output, backend):
+    # Chạy trong process riêng để peak RSS không bị lẫn giữa các case
+    phases, total = BENCHMARKS[name](source, output, backend)
+    return {
+        'phases': {k: round(v, 6) for k, v in phases.items()},
+        'totalSeconds': round(total, 6),
+        'peakRssKb': _peak_rss_kb(),
+    }
+
+
+def run_case(name, source, output, repeat=1, backend='docx'):
+    ctx = multiprocessing.get_context('spawn')
+    runs = []
+    for _ in range(repeat):
+        with ctx.Pool(1) as pool:
+            runs.append(pool.apply(_run_case, (name, source, output, backend)))
+    # Lấy lần chạy nhanh nhất để giảm nhiễu
+    best = min(runs, key=lambda r: r['totalSeconds'])
+    best['peakRssKb'] = max(r['peakRssKb'] for r in runs)
+    best['runs'] = [r['totalSeconds'] for r in runs]
+    return best
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline_file):
+    with open(baseline_file, 'r', encoding='utf-8') as f:
+        baseline = {r['case']: r for r in json.load(f)['results']}
+    for result in results:
+        old = baseline.get(result['case'])
+        if not old:
+            continue
+        ratio = result['totalSeconds'] / old['totalSeconds'] if old['totalSeconds'] else float('inf')
+        print(f"{result['case']:<36} {old['totalSeconds']:>9.3f}s -> {result['totalSeconds']:>9.3f}s "
+              f"({ratio:.2f}x), RSS {old['peakRssKb']} -> {result['peakRssKb']} KB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark pipeline Markdown -> DOCX')
+    parser.add_argument('--sizes', default=','.join(DEFAULT_SIZES), help='Kích thước corpus, vd. 1KB,1MB,50MB')
+    parser.add_argument('--repeat', type=int, default=1, help='Số lần chạy mỗi case')
+    parser.add_argument('--output', default='bench_results.json', help='File JSON kết quả')
+    parser.add_argument('--baseline', help='File JSON kết quả cũ để so sánh')
+    parser.add_argument('--writers', default='docx', help='Các writer backend cho markdown_to_word, vd. docx,streaming')
+    parser.add_argument('--work-dir', help='Thư mục chứa corpus tổng hợp (mặc định: thư mục tạm)')
+    args = parser.parse_args()
+
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix='docx-bench-')
+    os.makedirs(work_dir, exist_ok=True)
+    results = []
+
+    for size_text in args.sizes.split(','):
+        md_file = os.path.join(work_dir, f'synthetic-{size_text}.md')
+        size = generate_markdown(md_file, parse_size(size_text))
+        for backend in args.writers.split(','):
+            result = run_case('markdown_to_word', md_file, md_file[:-3] + f'-{backend}.docx', args.repeat, backend)
+            result.update(case=f'markdown_to_word[{size_text},{backend}]', sizeBytes=size)
+            results.append(result)
+            print(f"{result['case']:<36} {result['totalSeconds']:>9.3f}s  {result['peakRssKb']} KB  {result['phases']}")
+
+    from create_word_doc import DEFAULT_SPEC
+    result = run_case('create_project_proposal', DEFAULT_SPEC, os.path.join(work_dir, 'proposal.docx'), args.repeat)
+    result.update(case='create_project_proposal', sizeBytes=os.path.getsize(DEFAULT_SPEC))
+    results.append(result)
+    print(f"{result['case']:<36} {result['totalSeconds']:>9.3f}s  {result['peakRssKb']} KB  {result['phases']}")
+
+    report = {
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'results': results,
+    }
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"Đã ghi kết quả: {args.output}")
+
+    if args.baseline:
+        compare(results, args.baseline)
+
+if __name__ == "__main__":
+    main()
@@ -1,114 +1,425 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+import argparse
+import copy
 import re
-from docx import Document
-from docx.shared import Inches, Pt
+from collections import namedtuple
+from docx.oxml import OxmlElement, parse_xml
+from docx.oxml.ns import nsdecls, qn
+from docx.oxml.table import CT_Tbl
+from docx.table import Table as DocxTable
+from docx.text.paragraph import Paragraph as DocxParagraph
 from docx.enum.text import WD_ALIGN_PARAGRAPH
-from docx.enum.style import WD_STYLE_TYPE
-
-def markdown_to_word(md_file, docx_file):
-    # Đọc file Markdown
-    with open(md_file, 'r', encoding='utf-8') as f:
-        content = f.read()
-    
-    # Tạo document mới
-    doc = Document()
-    
-    # Thiết lập styles
-    styles = doc.styles
-    
-    # Style cho heading 1
-    h1_style = styles.add_style('Heading 1', WD_STYLE_TYPE.PARAGRAPH)
-    h1_style.font.size = Pt(18)
-    h1_style.font.bold = True
-    h1_style.space_after = Pt(12)
-    
-    # Style cho heading 2
-    h2_style = styles.add_style('Heading 2', WD_STYLE_TYPE.PARAGRAPH)
-    h2_style.font.size = Pt(16)
-    h2_style.font.bold = True
-    h2_style.space_after = Pt(10)
-    
-    # Style cho heading 3
-    h3_style = styles.add_style('Heading 3', WD_STYLE_TYPE.PARAGRAPH)
-    h3_style.font.size = Pt(14)
-    h3_style.font.bold = True
-    h3_style.space_after = Pt(8)
-    
-    # Style cho normal text
-    normal_style = styles.add_style('Normal Text', WD_STYLE_TYPE.PARAGRAPH)
-    normal_style.font.size = Pt(12)
-    normal_style.space_after = Pt(6)
-    
-    # Style cho code
-    code_style = styles.add_style('Code', WD_STYLE_TYPE.PARAGRAPH)
-    code_style.font.size = Pt(10)
-    code_style.font.name = 'Courier New'
-    code_style.space_after = Pt(6)
-    
-    # Tách nội dung thành các dòng
-    lines = content.split('\n')
-    
-    for line in lines:
-        line = line.strip()
-        
+from lxml.etree import tostring as etree_tostring
+
+from docx_template import indent_style, new_document, style_fingerprint
+from section_cache import DEFAULT_CACHE_DIR, DEFAULT_MAX_ENTRIES, SectionCache, section_key
+
+# Các sự kiện block mà tokenizer sinh ra
+Blank = namedtuple('Blank', '')
+Heading = namedtuple('Heading', 'level spans')
+ListItem = namedtuple('ListItem', 'ordered level spans')
+CodeLine = namedtuple('CodeLine', 'language text')
+Table = namedtuple('Table', 'rows header')
+Paragraph = namedtuple('Paragraph', 'spans')
+
+# Tăng khi cách parse/render thay đổi để cache section cũ không được dùng lại
+RENDERER_VERSION = 4
+
+# Định dạng inline của một span, dạng bitmask
+BOLD, ITALIC, CODE = 1, 2, 4
+DELIMITERS = {'**': BOLD, '__': BOLD, '*': ITALIC, '_': ITALIC}
+TEXT, OPEN, CLOSE, CODE_SPAN, LINK = range(5)
+
+# Regex biên dịch sẵn một lần cho mọi dòng
+HEADING_RE = re.compile(r'^(#{1,3}) (.*)$')
+BULLET_RE = re.compile(r'^([ \t]*)[-*] (.*)$')
+NUMBERED_RE = re.compile(r'^([ \t]*)\d+\. (.*)$')
+FENCE_RE = re.compile(r'^\s*```\s*(\S*)')
+SECTION_RE = re.compile(r'^##? ')
+INLINE_RE = re.compile(r"""
+    \\(?P<escaped>[\\`*_\[\]()#+\-.!|])              # ký tự escape
+  | (?P<ticks>`+)(?P<code>.+?)(?P<code_end>(?P=ticks))  # code span
+  | \[(?P<label>[^\]]+)\]\((?P<url>[^)\s]+)\)         # link
+  | (?P<delim>\*\*|__|\*|_)                            # bold / italic
+""", re.X)
+# Ký tự không hợp lệ trong XML 1.0 (control character, surrogate lẻ, U+FFFE/U+FFFF)
+XML_INVALID_RE = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f\ud800-\udfff\ufffe\uffff]')
+TABLE_SEPARATOR_RE = re.compile(r'^\|?\s*:?-+:?\s*(\|\s*:?-+:?\s*)*\|?$')
+
+
+def parse_inline(text):
+    # Lexer inline một lượt: bold, italic, code span, link và ký tự escape.
+    # Trả về danh sách span (text, fmt, url), các span liền kề cùng định dạng được gộp lại.
+    tokens = []
+    opened = {}
+    pos = 0
+
+    for m in INLINE_RE.finditer(text):
+        if m.start() > pos:
+            tokens.append((TEXT, text[pos:m.start()]))
+        pos = m.end()
+        kind = m.lastgroup
+        if kind == 'escaped':
+            tokens.append((TEXT, m.group('escaped')))
+        elif kind == 'code_end':
+            tokens.append((CODE_SPAN, m.group('code')))
+        elif kind == 'url':
+            tokens.append((LINK, m.group('label'), m.group('url')))
+        else:
+            delim = m.group('delim')
+            before = text[m.start() - 1] if m.start() else ' '
+            after = text[m.end()] if m.end() < len(text) else ' '
+            # '_' không được tính khi nằm giữa từ (vd. user_id)
+            if delim in opened:
+                if not before.isspace() and (delim[0] == '*' or not after.isalnum()):
+                    tokens[opened.pop(delim)] = (OPEN, DELIMITERS[delim])
+                    tokens.append((CLOSE, DELIMITERS[delim]))
+                    continue
+            elif not after.isspace() and (delim[0] == '*' or not before.isalnum()):
+                # Tạm coi là text cho tới khi gặp dấu đóng tương ứng
+                opened[delim] = len(tokens)
+            tokens.append((TEXT, delim))
+    if pos < len(text):
+        tokens.append((TEXT, text[pos:]))
+
+    spans = []
+    depth = {BOLD: 0, ITALIC: 0}
+    fmt = 0
+    for token in tokens:
+        kind = token[0]
+        if kind == OPEN or kind == CLOSE:
+            depth[token[1]] += 1 if kind == OPEN else -1
+            fmt = (BOLD if depth[BOLD] else 0) | (ITALIC if depth[ITALIC] else 0)
+            continue
+        if kind == TEXT:
+            span = (token[1], fmt, None)
+        elif kind == CODE_SPAN:
+            span = (token[1], fmt | CODE, None)
+        else:
+            span = (token[1], fmt, token[2])
+        if not span[0]:
+            continue
+        if spans and spans[-1][1:] == span[1:]:
+            spans[-1] = (spans[-1][0] + span[0],) + span[1:]
+        else:
+            spans.append(span)
+    return spans
+
+
+def plain_text(spans):
+    return ''.join(span[0] for span in spans)
+
+
+def _indent_level(prefix):
+    return len(prefix.expandtabs(4)) // 2
+
+
+def xml_text(text):
+    # Bỏ các ký tự Word không đọc được; hai backend xử lý cùng một cách
+    return XML_INVALID_RE.sub('', text)
+
+
+def _split_row(line):
+    return [parse_inline(cell.strip()) for cell in line.strip().strip('|').split('|')]
+
+
+def iter_blocks(lines):
+    # Đọc từng dòng và sinh ra các sự kiện block, không giữ toàn bộ file trong bộ nhớ
+    fence = None
+    table = None
+    header = False
+
+    for raw in lines:
+        raw = raw.rstrip('\r\n')
+
+        # Nội dung bên trong code block được giữ nguyên
+        if fence is not None:
+            if FENCE_RE.match(raw):
+                fence = None
+            else:
+                yield CodeLine(fence, raw)
+            continue
+
+        line = raw.strip()
+
+        # Table: gom các dòng liên tiếp bắt đầu bằng |
+        if line.startswith('|'):
+            if table is None:
+                table = []
+                header = False
+            if not TABLE_SEPARATOR_RE.match(line):
+                table.append(_split_row(line))
+            elif len(table) == 1:
+                # Dòng phân cách ngay sau dòng đầu: dòng đầu là header
+                header = True
+            continue
+        if table is not None:
+            # Bảng chỉ có dòng phân cách không có ô nào: bỏ qua
+            if table:
+                yield Table(table, header)
+            table = None
+
         if not line:
-            doc.add_paragraph()
+            yield Blank()
             continue
-            
-        # Heading 1
-        if line.startswith('# '):
-            text = line[2:]
-            p = doc.add_paragraph(text, style='Heading 1')
-            p.alignment = WD_ALIGN_PARAGRAPH.CENTER
-            
-        # Heading 2
-        elif line.startswith('## '):
-            text = line[3:]
-            doc.add_paragraph(text, style='Heading 2')
-            
-        # Heading 3
-        elif line.startswith('### '):
-            text = line[4:]
-            doc.add_paragraph(text, style='Heading 3')
-            
-        # Code block
-        elif line.startswith('```'):
+
+        match = FENCE_RE.match(line)
+        if match:
+            fence = match.group(1)
+            continue
+
+        match = HEADING_RE.match(line)
+        if match:
+            yield Heading(len(match.group(1)), parse_inline(match.group(2)))
+            continue
+
+        match = BULLET_RE.match(raw)
+        if match:
+            yield ListItem(False, _indent_level(match.group(1)), parse_inline(match.group(2)))
             continue
-            
-        # List item
-        elif line.startswith('- ') or line.startswith('* '):
-            text = line[2:]
-            p = doc.add_paragraph(text, style='Normal Text')
-            p.paragraph_format.left_indent = Inches(0.25)
-            
-        # Numbered list
-        elif re.match(r'^\d+\. ', line):
-            text = re.sub(r'^\d+\. ', '', line)
-            p = doc.add_paragraph(text, style='Normal Text')
-            p.paragraph_format.left_indent = Inches(0.25)
-            
-        # Bold text
-        elif '**' in line:
-            # Xử lý bold text
-            parts = line.split('**')
-            p = doc.add_paragraph(style='Normal Text')
-            for i, part in enumerate(parts):
-                if i % 2 == 0:  # Regular text
-                    if part:
-                        p.add_run(part)
-                else:  # Bold text
-                    run = p.add_run(part)
-                    run.bold = True
-                    
-        # Regular paragraph
+
+        match = NUMBERED_RE.match(raw)
+        if match:
+            yield ListItem(True, _indent_level(match.group(1)), parse_inline(match.group(2)))
+            continue
+
+        yield Paragraph(parse_inline(line))
+
+    if table:
+        yield Table(table, header)
+
+
+def iter_sections(lines):
+    # Tách Markdown thành các section tại ranh giới # / ## (bỏ qua bên trong code block)
+    section = []
+    in_fence = False
+
+    for raw in lines:
+        if FENCE_RE.match(raw):
+            in_fence = not in_fence
+        elif not in_fence and section and SECTION_RE.match(raw):
+            yield ''.join(section)
+            section = []
+        section.append(raw)
+
+    if section:
+        yield ''.join(section)
+
+
+class BlockWriter:
+    # Giao diện chung của các writer backend: phân phối sự kiện block tới write_*.
+    # Tra theo tên class để vẫn đúng khi file này được chạy trực tiếp (__main__).
+    HANDLERS = {
+        'Blank': 'write_blank',
+        'Heading': 'write_heading',
+        'ListItem': 'write_list_item',
+        'CodeLine': 'write_code_line',
+        'Table': 'write_table',
+        'Paragraph': 'write_paragraph',
+    }
+
+    def __init__(self):
+        self._handlers = {name: getattr(self, method) for name, method in self.HANDLERS.items()}
+
+    def write(self, block):
+        self._handlers[type(block).__name__](block)
+
+    def write_all(self, blocks):
+        for block in blocks:
+            self.write(block)
+
+    def abort(self):
+        # Bỏ document đang ghi dở khi chuyển đổi lỗi; backend nào ghi file tạm thì dọn ở đây
+        pass
+
+
+class DocxWriter(BlockWriter):
+    # Nhận các sự kiện block từ iter_blocks và ghi vào document python-docx
+
+    def __init__(self, doc=None):
+        super().__init__()
+        if doc is None:
+            doc = new_document()
+        self.doc = doc
+        self._body = doc._body
+        # document.add_paragraph() tìm sectPr từ đầu body ở mỗi lần thêm (O(n) mỗi lần),
+        # nên giữ sẵn sectPr và chèn phần tử mới ngay trước nó
+        self._sect_pr = doc.element.body.sectPr
+        # Gán style qua style id: paragraph.style = ... duyệt toàn bộ styles.xml ở mỗi lần gán
+        self._style_ids = {style.name: style.style_id for style in doc.styles}
+        section = doc.sections[-1]
+        self._table_width = section.page_width - section.left_margin - section.right_margin
+
+    def _append(self, element):
+        if self._sect_pr is not None:
+            self._sect_pr.addprevious(element)
         else:
-            doc.add_paragraph(line, style='Normal Text')
-    
-    # Lưu document
-    doc.save(docx_file)
+            self.doc.element.body.append(element)
+
+    def _add_paragraph(self, style_name=None, alignment=None):
+        p = OxmlElement('w:p')
+        self._append(p)
+        paragraph = DocxParagraph(p, self._body)
+        if style_name:
+            p.style = self._style_ids[style_name]
+        if alignment is not None:
+            paragraph.alignment = alignment
+        return paragraph
+
+    def _add_spans(self, paragraph, spans, extra_fmt=0):
+        for text, fmt, url in spans:
+            fmt |= extra_fmt
+            run = paragraph.add_run(xml_text(text))
+            if fmt & BOLD:
+                run.bold = True
+            if fmt & ITALIC:
+                run.italic = True
+            if fmt & CODE:
+                run._r.style = self._style_ids['Inline Code']
+            if url:
+                # Link dùng field HYPERLINK nên không cần relationship trong document part
+                if not fmt & CODE:
+                    run._r.style = self._style_ids['Hyperlink']
+                field = OxmlElement('w:fldSimple')
+                field.set(qn('w:instr'), xml_text(f'HYPERLINK "{url}"'))
+                run._r.addprevious(field)
+                field.append(run._r)
+        return paragraph
+
+    def write_blank(self, block):
+        self._add_paragraph()
+
+    def write_heading(self, block):
+        alignment = WD_ALIGN_PARAGRAPH.CENTER if block.level == 1 else None
+        self._add_spans(self._add_paragraph(f'Heading {block.level}', alignment), block.spans)
+
+    def write_list_item(self, block):
+        self._add_spans(self._add_paragraph(indent_style(block.level + 1)), block.spans)
+
+    def write_code_line(self, block):
+        paragraph = self._add_paragraph('Code')
+        if block.text:
+            paragraph.add_run(xml_text(block.text))
+
+    def write_table(self, block):
+        # Dựng sẵn toàn bộ XML của bảng một lần rồi điền từng ô qua phần tử tc,
+        # tránh table.cell(r, c) vốn duyệt lại cả bảng ở mỗi lần gọi
+        cols = max((len(row) for row in block.rows), default=0)
+        if not cols:
+            return
+        tbl = CT_Tbl.new_tbl(len(block.rows), cols, self._table_width)
+        self._append(tbl)
+        table = DocxTable(tbl, self._body)
+        tbl.tblPr.style = self._style_ids['Table Grid']
+
+        for r, (tr, row) in enumerate(zip(tbl.tr_lst, block.rows)):
+            header = block.header and r == 0
+            if header:
+                tr.get_or_add_trPr().append(OxmlElement('w:tblHeader'))
+            for tc, spans in zip(tr.tc_lst, row):
+                self._add_spans(DocxParagraph(tc.p_lst[0], table), spans, BOLD if header else 0)
+
+    def write_paragraph(self, block):
+        self._add_spans(self._add_paragraph('Normal Text'), block.spans)
+
+    def begin_fragment(self):
+        self._fragment_start = len(self.doc.element.body) - self._tail_count()
+
+    def end_fragment(self):
+        # Serialize các phần tử vừa được thêm vào body thành một fragment OOXML
+        body = self.doc.element.body
+        end = len(body) - self._tail_count()
+        wrapper = parse_xml(f'<w:body {nsdecls("w")}/>')
+        for element in body[self._fragment_start:end]:
+            wrapper.append(copy.deepcopy(element))
+        return etree_tostring(wrapper)
+
+    def insert_fragment(self, fragment):
+        for element in list(parse_xml(fragment)):
+            self._append(element)
+
+    def _tail_count(self):
+        return 0 if self._sect_pr is None else 1
+
+    def save(self, path):
+        self.doc.save(path)
+
+
+def write_sections(writer, lines, cache):
+    # Chỉ render lại các section có nội dung thay đổi, phần còn lại lấy từ cache
+    config = (type(writer).__name__, RENDERER_VERSION, style_fingerprint())
+    for section in iter_sections(lines):
+        key = section_key(section, *config)
+        fragment = cache.get(key)
+        if fragment is None:
+            writer.begin_fragment()
+            writer.write_all(iter_blocks(section.splitlines()))
+            cache.put(key, writer.end_fragment())
+        else:
+            writer.insert_fragment(fragment)
+
+
+WRITER_BACKENDS = ('docx', 'streaming')
+
+
+def make_writer(backend='docx', docx_file=None):
+    # 'docx': dựng document bằng python-docx; 'streaming': ghi OOXML thẳng vào file zip
+    if backend == 'streaming':
+        from ooxml_writer import StreamingDocxWriter
+        return StreamingDocxWriter(docx_file)
+    if backend == 'docx':
+        return DocxWriter()
+    raise ValueError(f"Unknown writer backend '{backend}'")
+
+
+def markdown_to_word(md_file, docx_file, writer=None, cache=None):
+    if writer is None:
+        writer = DocxWriter()
+
+    try:
+        # Đọc file Markdown theo từng dòng
+        with open(md_file, 'r', encoding='utf-8') as f:
+            if cache is None:
+                writer.write_all(iter_blocks(f))
+            else:
+                write_sections(writer, f, cache)
+
+        # Lưu document
+        writer.save(docx_file)
+    except BaseException:
+        writer.abort()
+        raise
     print(f"Đã tạo file Word: {docx_file}")
 
+def main():
+    parser = argparse.ArgumentParser(description='Chuyển file Markdown sang Word')
+    parser.add_argument('md_file', nargs='?', default='Project_Proposal_Feature_Flag_Management.md')
+    parser.add_argument('docx_file', nargs='?', default='Project_Proposal_Feature_Flag_Management.docx')
+    parser.add_argument('--writer', choices=WRITER_BACKENDS, default='docx',
+                        help='streaming: ghi trực tiếp vào file, bộ nhớ không tăng theo kích thước document')
+    parser.add_argument('--incremental', action='store_true', help='Dùng lại các section không thay đổi từ cache')
+    parser.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR)
+    parser.add_argument('--cache-size', type=int, default=DEFAULT_MAX_ENTRIES, help='Số fragment tối đa giữ trong cache')
+    parser.add_argument('--profile', help='Ghi histogram thời gian xử lý từng loại block ra file (.json hoặc .prom)')
+    args = parser.parse_args()
+
+    cache = SectionCache(args.cache_dir, args.cache_size) if args.incremental else None
+    writer = make_writer(args.writer, args.docx_file)
+    profiler = None
+    if args.profile:
+        from featureflags.profiler import Profiler
+        profiler = Profiler()
+        profiler.instrument_writer(writer)
+    markdown_to_word(args.md_file, args.docx_file, writer=writer, cache=cache)
+    if profiler is not None:
+        profiler.stop()
+        profiler.write(args.profile)
+        print(f"Đã ghi profile: {args.profile}")
+    if cache is not None:
+        print(f"Cache: {cache.hits} section dùng lại, {cache.misses} section render mới")
+
 if __name__ == "__main__":
-    markdown_to_word('Project_Proposal_Feature_Flag_Management.md', 'Project_Proposal_Feature_Flag_Management.docx') 
\ No newline at end of file
+    main()
+
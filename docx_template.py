@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import functools
+import hashlib
+import io
+import os
+
+from docx import Document
+from docx.shared import Inches, Pt, RGBColor
+from docx.enum.style import WD_STYLE_TYPE
+
+# Cấu hình style dùng chung: (tên, cỡ chữ, bold, space_after, font)
+STYLES = (
+    ('Heading 1', 18, True, 12, None),
+    ('Heading 2', 16, True, 10, None),
+    ('Heading 3', 14, True, 8, None),
+    ('Normal Text', 12, False, 6, None),
+    ('Code', 10, False, 6, 'Courier New'),
+)
+
+# Style cho list theo cấp thụt lề: (tên, style gốc, left_indent theo inch)
+INDENT_STYLES = (
+    ('List Indent 1', 'Normal Text', 0.25),
+    ('List Indent 2', 'Normal Text', 0.5),
+    ('List Indent 3', 'Normal Text', 0.75),
+)
+
+# Character style cho định dạng inline: (tên, cỡ chữ, font, màu, gạch chân)
+CHARACTER_STYLES = (
+    ('Inline Code', 10, 'Courier New', None, False),
+    ('Hyperlink', None, None, '0563C1', True),
+)
+
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.docx_cache')
+
+
+def style_fingerprint():
+    return hashlib.sha256(repr((STYLES, INDENT_STYLES, CHARACTER_STYLES)).encode('utf-8')).hexdigest()[:16]
+
+
+def setup_styles(doc):
+    styles = doc.styles
+
+    for name, size, bold, space_after, font_name in STYLES:
+        # Template mặc định của python-docx đã có sẵn 'Heading 1'...'Heading 9'
+        if name in styles:
+            style = styles[name]
+        else:
+            style = styles.add_style(name, WD_STYLE_TYPE.PARAGRAPH)
+        style.font.size = Pt(size)
+        if bold:
+            style.font.bold = True
+        if font_name:
+            style.font.name = font_name
+        style.paragraph_format.space_after = Pt(space_after)
+
+    # Thụt lề được đặt một lần trên style thay vì trên từng paragraph
+    for name, base_name, indent in INDENT_STYLES:
+        if name in styles:
+            style = styles[name]
+        else:
+            style = styles.add_style(name, WD_STYLE_TYPE.PARAGRAPH)
+        style.base_style = styles[base_name]
+        style.paragraph_format.left_indent = Inches(indent)
+
+    for name, size, font_name, color, underline in CHARACTER_STYLES:
+        if name in styles:
+            style = styles[name]
+        else:
+            style = styles.add_style(name, WD_STYLE_TYPE.CHARACTER)
+        if size:
+            style.font.size = Pt(size)
+        if font_name:
+            style.font.name = font_name
+        if color:
+            style.font.color.rgb = RGBColor.from_string(color)
+        if underline:
+            style.font.underline = True
+
+
+def indent_style(level):
+    # level bắt đầu từ 1; các cấp sâu hơn dùng style thụt lề lớn nhất
+    return INDENT_STYLES[min(level, len(INDENT_STYLES)) - 1][0]
+
+
+def template_path():
+    # Tên file chứa fingerprint nên template tự sinh lại khi STYLES thay đổi
+    return os.path.join(TEMPLATE_DIR, f'base-template-{style_fingerprint()}.docx')
+
+
+def build_template(path):
+    doc = Document()
+    setup_styles(doc)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    doc.save(tmp_path)
+    os.replace(tmp_path, path)
+
+
+@functools.lru_cache(maxsize=None)
+def load_template_bytes():
+    # Sinh template một lần trên đĩa, sau đó mỗi process chỉ đọc một lần vào bộ nhớ
+    path = template_path()
+    if not os.path.exists(path):
+        build_template(path)
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+@functools.lru_cache(maxsize=None)
+def style_ids():
+    # Ánh xạ tên style -> style id của template, dùng cho các writer ghi OOXML trực tiếp
+    return {style.name: style.style_id for style in new_document().styles}
+
+
+def new_document():
+    # Clone document từ template trong bộ nhớ, không phải dựng lại style
+    return Document(io.BytesIO(load_template_bytes()))
@@ -0,0 +1,5 @@
+"""Python SDK for the feature flags defined in aws-config/appconfig/feature-flags.json."""
+
+from .evaluator import CompiledFlag, FlagEvaluator, hash_user_id, load_flags
+
+__all__ = ['CompiledFlag', 'FlagEvaluator', 'hash_user_id', 'load_flags']
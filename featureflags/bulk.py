@@ -0,0 +1,232 @@
+"""Vectorized evaluation of many users against many flags for cohort analysis."""
+
+try:
+    import numpy as np
+except ImportError:
+    raise ImportError('featureflags.bulk requires numpy. Please run: pip install numpy')
+
+from .evaluator import UINT32_MASK, FlagEvaluator, string_hash
+
+DISABLED = -1
+
+_INV31 = pow(31, -1, 0x100000000)
+
+
+def _js_abs(hashes):
+    """Vectorized js_abs(): Math.abs of uint32 hashes read as int32."""
+    return np.where(hashes & 0x80000000, 0x100000000 - hashes, hashes)
+
+
+def hash_prefixes(user_ids):
+    """string_hash() of every user id, as a uint64 array of 32-bit values.
+
+    Ids are laid out as a fixed-width UTF-32 matrix and hashed one column at a
+    time; the trailing NUL padding is then divided out with the modular inverse
+    of 31, which exists because 31 is odd.
+    """
+    ids = np.asarray(user_ids, dtype=str)
+    n = ids.shape[0]
+    width = ids.dtype.itemsize // 4
+    hashes = np.zeros(n, dtype=np.uint64)
+    if n == 0 or width == 0:
+        return hashes
+
+    units = ids.view(np.uint32).reshape(n, width)
+    astral = np.zeros(n, dtype=bool)
+    for column in units.T:
+        hashes = (hashes * 31 + column.astype(np.uint64)) & UINT32_MASK
+        astral |= column > 0xFFFF
+
+    lengths = np.char.str_len(ids)
+    inverse_powers = np.array([pow(_INV31, k, 0x100000000) for k in range(width + 1)], dtype=np.uint64)
+    hashes = (hashes * inverse_powers[width - lengths]) & UINT32_MASK
+
+    # charCodeAt sees astral characters as two UTF-16 units, and fixed-width str_
+    # arrays drop trailing NULs; rehash those ids exactly from the original strings
+    originals = ids
+    if not (isinstance(user_ids, np.ndarray) and user_ids.dtype.kind == 'U'):
+        originals = user_ids
+        astral |= np.fromiter((str(user_id).endswith('\x00') for user_id in user_ids), dtype=bool, count=n)
+    for i in np.flatnonzero(astral):
+        hashes[i] = string_hash(str(originals[i]))
+    return hashes
+
+
+class UserBatch:
+    """User ids with their precomputed hashes and group memberships."""
+
+    def __init__(self, user_ids, user_groups=None, group_vocabulary=()):
+        # object dtype keeps ids exactly; a str_ array would drop trailing NULs
+        self.user_ids = np.array([str(user_id) for user_id in user_ids], dtype=object)
+        self.hashes = hash_prefixes(self.user_ids)
+        self.group_index = {group: i for i, group in enumerate(sorted(group_vocabulary))}
+        self.groups = np.zeros((len(self.user_ids), len(self.group_index)), dtype=bool)
+        if user_groups is not None:
+            index = self.group_index
+            for row, groups in enumerate(user_groups):
+                for group in groups:
+                    column = index.get(group)
+                    if column is not None:
+                        self.groups[row, column] = True
+
+    def __len__(self):
+        return len(self.user_ids)
+
+    def in_any_group(self, groups):
+        columns = [self.group_index[group] for group in groups if group in self.group_index]
+        if not columns:
+            return np.zeros(len(self), dtype=bool)
+        return self.groups[:, columns].any(axis=1)
+
+
+class BulkResult:
+    """Enabled and variant matrices with one row per flag and one column per user."""
+
+    def __init__(self, flag_names, user_ids, enabled, variant_codes, variant_names):
+        self.flag_names = flag_names
+        self.user_ids = user_ids
+        self.enabled = enabled
+        self.variant_codes = variant_codes
+        self.variant_names = variant_names
+
+    def row(self, flag_name):
+        return self.flag_names.index(flag_name)
+
+    def enabled_counts(self):
+        return dict(zip(self.flag_names, self.enabled.sum(axis=1).tolist()))
+
+    def variant_counts(self, flag_name):
+        """Number of users assigned to each variant of one flag."""
+        i = self.row(flag_name)
+        codes = self.variant_codes[i]
+        counts = np.bincount(codes[codes != DISABLED], minlength=len(self.variant_names[i]))
+        return dict(zip(self.variant_names[i], counts.tolist()))
+
+    def variants(self, flag_name):
+        """Variant names for every user of one flag, None where the flag is off."""
+        i = self.row(flag_name)
+        names = np.array(list(self.variant_names[i]) + [None], dtype=object)
+        return names[self.variant_codes[i]]
+
+    def for_user(self, index):
+        """The /batch-evaluate `results` object for the user at column index."""
+        results = {}
+        for i, name in enumerate(self.flag_names):
+            code = self.variant_codes[i, index]
+            results[name] = {
+                'enabled': bool(self.enabled[i, index]),
+                'variant': None if code == DISABLED else self.variant_names[i][code],
+            }
+        return results
+
+
+class BulkEvaluator:
+    """Evaluates a flag set for arrays of users with NumPy instead of per-user loops."""
+
+    def __init__(self, flags):
+        if not isinstance(flags, FlagEvaluator):
+            flags = FlagEvaluator(flags)
+        self.evaluator = flags
+
+    def group_vocabulary(self):
+        groups = set()
+        for flag in self.evaluator.flags.values():
+            if flag.user_groups:
+                groups.update(flag.user_groups)
+        return groups
+
+    def users(self, user_ids, user_groups=None):
+        """Hash user ids once so several evaluations can share the work."""
+        return UserBatch(user_ids, user_groups, self.group_vocabulary())
+
+    def enabled_mask(self, flag, users, rollout_percentage=None):
+        """Vectorized isFeatureEnabled for one compiled flag."""
+        n = len(users)
+        if not flag.enabled:
+            return np.zeros(n, dtype=bool)
+
+        mask = np.ones(n, dtype=bool)
+        if flag.user_groups is not None:
+            mask &= users.in_any_group(flag.user_groups)
+
+        rollout = flag.rollout_percentage if rollout_percentage is None else rollout_percentage
+        if rollout < 100:
+            buckets = _js_abs((users.hashes * flag.rollout_mult + flag.rollout_add) & UINT32_MASK) % 100
+            mask &= buckets < rollout
+
+        if flag.user_ids:
+            # Compare integer hashes first, then confirm the few candidates by string
+            targets = np.array([string_hash(user_id) for user_id in flag.user_ids], dtype=np.uint64)
+            candidates = np.flatnonzero(np.isin(users.hashes, targets))
+            for i in candidates:
+                if users.user_ids[i] in flag.user_ids:
+                    mask[i] = True
+        return mask
+
+    def variant_codes(self, flag, users, enabled):
+        """Index into flag.variant_names for every user, DISABLED where the flag is off."""
+        n = len(users)
+        codes = np.full(n, DISABLED, dtype=np.int32)
+        count = len(flag.variant_names)
+        total = flag.total_weight
+        if count <= 1 or total == 0 or total != total:
+            # No variants ('control'), a single variant, or a zero/NaN total: always index 0
+            codes[enabled] = 0
+            return codes
+
+        hashes = users.hashes[enabled]
+        # As in choose_variant, a negative total behaves like its absolute value under JS %
+        weights = _js_abs((hashes * flag.variant_mult + flag.variant_add) & UINT32_MASK) % abs(total)
+        cumulative = np.asarray(flag.cumulative_weights)
+        if flag.linear_variants:
+            chosen = np.full(len(hashes), DISABLED, dtype=np.int32)
+            for i, bound in enumerate(cumulative):
+                chosen[(chosen == DISABLED) & (weights < bound)] = i
+        else:
+            chosen = np.searchsorted(cumulative, weights, side='right').astype(np.int32)
+            chosen[chosen >= count] = DISABLED
+        chosen[chosen == DISABLED] = 0
+        codes[enabled] = chosen
+        return codes
+
+    def evaluate(self, users, flag_names=None, overrides=None):
+        """Evaluate flag_names (default: all flags) for a UserBatch or a sequence of user ids.
+
+        overrides maps a flag name to a rollout percentage to evaluate instead of the
+        configured one.
+        """
+        if not isinstance(users, UserBatch):
+            users = self.users(users)
+        flag_names = list(self.evaluator.flags) if flag_names is None else list(flag_names)
+        overrides = overrides or {}
+
+        enabled = np.zeros((len(flag_names), len(users)), dtype=bool)
+        codes = np.full((len(flag_names), len(users)), DISABLED, dtype=np.int32)
+        variant_names = []
+        for i, name in enumerate(flag_names):
+            flag = self.evaluator.flags.get(name)
+            if flag is None:
+                variant_names.append(())
+                continue
+            enabled[i] = self.enabled_mask(flag, users, overrides.get(name))
+            codes[i] = self.variant_codes(flag, users, enabled[i])
+            variant_names.append(flag.variant_names or ('control',))
+        return BulkResult(flag_names, users.user_ids, enabled, codes, variant_names)
+
+    def rollout_impact(self, users, flag_name, new_percentage):
+        """How many users gain or lose a flag when its rollout moves to new_percentage."""
+        if not isinstance(users, UserBatch):
+            users = self.users(users)
+        flag = self.evaluator.flags[flag_name]
+        before = self.enabled_mask(flag, users)
+        after = self.enabled_mask(flag, users, new_percentage)
+        return {
+            'flagName': flag_name,
+            'users': len(users),
+            'fromPercentage': flag.rollout_percentage,
+            'toPercentage': new_percentage,
+            'enabledBefore': int(before.sum()),
+            'enabledAfter': int(after.sum()),
+            'added': int((after & ~before).sum()),
+            'removed': int((before & ~after).sum()),
+        }
@@ -0,0 +1,344 @@
+"""Sequence-numbered JSON-patch change log for feature-flags.json documents.
+
+The publisher calls ChangeLog.record() with every new document; the log keeps
+the RFC 6902 delta from the previous one under a monotonically increasing seq.
+Subscribers ask for changes_since(seq, epoch) and get either the deltas they are
+missing or, when they are too far behind or the log was recreated (new epoch),
+one compact snapshot of the whole document.
+
+A log backed by a directory is a single NDJSON file: a header line with the
+epoch and the document at base_seq, then one line per change. Other processes
+open the same directory read-only and reload it when the file changes.
+"""
+
+import collections
+import copy
+import json
+import logging
+import os
+import tempfile
+import threading
+import urllib.parse
+import urllib.request
+import uuid
+
+from .evaluator import CompiledFlag, FlagEvaluator
+
+logger = logging.getLogger(__name__)
+
+LOG_FILE = 'changes.ndjson'
+DEFAULT_MAX_ENTRIES = 1000
+DEFAULT_MAX_DELTAS = 100
+
+
+class PatchError(ValueError):
+    pass
+
+
+def _escape(token):
+    return str(token).replace('~', '~0').replace('/', '~1')
+
+
+def _unescape(token):
+    return token.replace('~1', '/').replace('~0', '~')
+
+
+def _same(a, b):
+    # 1 == 1.0 == True in Python but not in JSON
+    return type(a) is type(b) and a == b
+
+
+def json_diff(old, new, path=''):
+    """RFC 6902 operations that turn old into new.
+
+    Objects are diffed key by key; a list that only grew at the end (e.g. a
+    targeting userIds list) becomes appends, any other list change a replace.
+    """
+    if isinstance(old, dict) and isinstance(new, dict):
+        ops = [{'op': 'remove', 'path': f'{path}/{_escape(key)}'} for key in old if key not in new]
+        for key, value in new.items():
+            child = f'{path}/{_escape(key)}'
+            if key not in old:
+                ops.append({'op': 'add', 'path': child, 'value': value})
+            elif not _same(old[key], value):
+                ops.extend(json_diff(old[key], value, child))
+        return ops
+    if isinstance(old, list) and isinstance(new, list) and len(new) > len(old) and new[:len(old)] == old:
+        return [{'op': 'add', 'path': f'{path}/-', 'value': value} for value in new[len(old):]]
+    if _same(old, new):
+        return []
+    return [{'op': 'replace', 'path': path, 'value': new}]
+
+
+def _index(node, token, op):
+    if token == '-' and op == 'add':
+        return len(node)
+    try:
+        index = int(token)
+    except ValueError:
+        raise PatchError(f'Invalid array index {token!r}')
+    if not 0 <= index <= len(node) - (op != 'add'):
+        raise PatchError(f'Array index {index} out of range')
+    return index
+
+
+def _apply(node, tokens, op, value):
+    # Copy only the containers on the path; everything else is shared with node
+    token = tokens[0]
+    if isinstance(node, list):
+        key = _index(node, token, op if len(tokens) == 1 else None)
+        result = list(node)
+    elif isinstance(node, dict):
+        key = _unescape(token)
+        result = dict(node)
+    else:
+        raise PatchError(f'Cannot address {token!r} inside a {type(node).__name__}')
+
+    if len(tokens) > 1:
+        missing = key not in result if isinstance(result, dict) else key >= len(result)
+        if missing:
+            raise PatchError(f'Path segment {token!r} does not exist')
+        result[key] = _apply(result[key], tokens[1:], op, value)
+    elif op == 'remove':
+        if isinstance(result, dict) and key not in result:
+            raise PatchError(f'Cannot remove missing key {key!r}')
+        del result[key]
+    elif op == 'add' and isinstance(result, list):
+        result.insert(key, value)
+    elif op == 'replace' and isinstance(result, dict) and key not in result:
+        raise PatchError(f'Cannot replace missing key {key!r}')
+    else:
+        result[key] = value
+    return result
+
+
+def apply_patch(document, ops):
+    """Apply add/remove/replace operations without mutating document."""
+    for operation in ops:
+        op, path = operation['op'], operation['path']
+        if op not in ('add', 'remove', 'replace'):
+            raise PatchError(f'Unsupported operation {op!r}')
+        if path == '':
+            if op == 'remove':
+                raise PatchError('Cannot remove the document root')
+            document = operation['value']
+            continue
+        document = _apply(document, path.split('/')[1:], op, operation.get('value'))
+    return document
+
+
+class ChangeLog:
+    """The last max_entries deltas of a flag document, addressed by sequence number."""
+
+    def __init__(self, directory=None, max_entries=DEFAULT_MAX_ENTRIES, max_deltas=DEFAULT_MAX_DELTAS):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.max_deltas = max_deltas
+        self.epoch = uuid.uuid4().hex
+        self.seq = 0
+        self.document = None
+        self._base = None
+        self._base_seq = 0
+        self._entries = collections.deque()
+        self._lines = 0
+        self._identity = None
+        self._lock = threading.RLock()
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+            if os.path.exists(self.path):
+                self._load()
+
+    @property
+    def path(self):
+        return os.path.join(self.directory, LOG_FILE)
+
+    def _stat_identity(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+    def _load(self):
+        with open(self.path, 'r', encoding='utf-8') as f:
+            # A line still being appended by the writer has no newline yet; skip it
+            lines = f.read().split('\n')[:-1]
+        header = json.loads(lines[0])
+        entries = [json.loads(line) for line in lines[1:] if line.strip()]
+        self.epoch = header['epoch']
+        self._base_seq = header['baseSeq']
+        self._base = header['base']
+        document = self._base
+        for entry in entries:
+            document = apply_patch(document, entry['patch'])
+        self.document = document
+        self.seq = entries[-1]['seq'] if entries else self._base_seq
+        self._entries = collections.deque(entries)
+        self._lines = len(entries)
+        self._trim()
+        self._identity = self._stat_identity()
+
+    def refresh(self):
+        """Reload after another process appended to or compacted the log file."""
+        if self.directory is None:
+            return False
+        with self._lock:
+            identity = self._stat_identity()
+            if identity is None or identity == self._identity:
+                return False
+            self._load()
+            return True
+
+    def _trim(self):
+        while len(self._entries) > self.max_entries:
+            entry = self._entries.popleft()
+            self._base = apply_patch(self._base, entry['patch'])
+            self._base_seq = entry['seq']
+
+    def _write_all(self):
+        header = {'epoch': self.epoch, 'baseSeq': self._base_seq, 'base': self._base}
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix='.changes-')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(json.dumps(header, ensure_ascii=False, separators=(',', ':')) + '\n')
+            for entry in self._entries:
+                f.write(json.dumps(entry, ensure_ascii=False, separators=(',', ':')) + '\n')
+        os.replace(tmp_path, self.path)
+        self._lines = len(self._entries)
+
+    def record(self, document):
+        """Append the delta from the current document to document; returns the new seq."""
+        # Deltas share values with the recorded document, so keep a private copy
+        document = copy.deepcopy(document)
+        with self._lock:
+            self.refresh()
+            if self.document is None:
+                # The first document is the base every later delta applies to. Subscribers
+                # that polled the empty log hold this epoch at seq 0, so a new epoch makes
+                # them fetch the base as a snapshot
+                self.epoch = uuid.uuid4().hex
+                self.document = self._base = document
+                if self.directory is not None:
+                    self._write_all()
+                    self._identity = self._stat_identity()
+                return self.seq
+
+            ops = json_diff(self.document, document)
+            if not ops:
+                return self.seq
+            self.seq += 1
+            entry = {
+                'seq': self.seq,
+                'version': document.get('version'),
+                'lastUpdated': document.get('lastUpdated'),
+                'patch': ops,
+            }
+            self._entries.append(entry)
+            self.document = apply_patch(self.document, ops)
+            self._trim()
+
+            if self.directory is not None:
+                if self._lines >= 2 * self.max_entries:
+                    self._write_all()
+                else:
+                    with open(self.path, 'a', encoding='utf-8') as f:
+                        f.write(json.dumps(entry, ensure_ascii=False, separators=(',', ':')) + '\n')
+                    self._lines += 1
+                self._identity = self._stat_identity()
+            logger.info('Recorded flag change %d (%d operations)', self.seq, len(ops))
+            return self.seq
+
+    def snapshot(self):
+        with self._lock:
+            return {'epoch': self.epoch, 'seq': self.seq, 'snapshot': self.document}
+
+    def changes_since(self, seq, epoch=None):
+        """Deltas after seq, or a snapshot when they are unavailable or would be longer."""
+        with self._lock:
+            self.refresh()
+            if epoch != self.epoch or seq > self.seq or seq < self._base_seq or self.seq - seq > self.max_deltas:
+                return self.snapshot()
+            first = len(self._entries) - (self.seq - seq)
+            return {
+                'epoch': self.epoch,
+                'seq': self.seq,
+                'changes': list(self._entries)[first:],
+            }
+
+
+class HttpChangeFeed:
+    """changes_since() over the evaluation server's GET /api/feature-flags/changes."""
+
+    def __init__(self, base_url='http://localhost:3100/api/feature-flags', timeout=10):
+        self.url = base_url.rstrip('/') + '/changes'
+        self.timeout = timeout
+
+    def __call__(self, seq, epoch=None):
+        query = {'since': seq}
+        if epoch:
+            query['epoch'] = epoch
+        with urllib.request.urlopen(f'{self.url}?{urllib.parse.urlencode(query)}', timeout=self.timeout) as response:
+            body = json.load(response)
+        if not body.get('success'):
+            raise RuntimeError(body.get('error'))
+        return body['data']
+
+
+class ChangeSubscriber:
+    """Keeps a document and its FlagEvaluator current by applying deltas from a feed.
+
+    feed is any callable (seq, epoch) -> changes_since() response, such as
+    ChangeLog.changes_since or an HttpChangeFeed. Only flags touched by a delta
+    are recompiled.
+    """
+
+    def __init__(self, feed, metrics=None):
+        self.feed = feed
+        self.metrics = metrics
+        self.epoch = None
+        self.seq = 0
+        self.document = None
+        self.evaluator = None
+
+    def poll(self):
+        """Fetch and apply pending changes; returns True when the flags changed."""
+        return self.apply(self.feed(self.seq, self.epoch))
+
+    def apply(self, response):
+        if 'snapshot' in response:
+            changed = response['snapshot'] is not None and not _same(self.document, response['snapshot'])
+            self.document = response['snapshot']
+            if changed:
+                self.evaluator = FlagEvaluator(self.document, self.metrics)
+        else:
+            touched = set()
+            rebuild = False
+            document = self.document
+            for change in response['changes']:
+                document = apply_patch(document, change['patch'])
+                for operation in change['patch']:
+                    tokens = operation['path'].split('/')
+                    if len(tokens) > 2 and tokens[1] == 'flags':
+                        touched.add(_unescape(tokens[2]))
+                    elif operation['path'] in ('', '/flags'):
+                        rebuild = True
+            changed = bool(response['changes'])
+            self.document = document
+            if rebuild:
+                self.evaluator = FlagEvaluator(document, self.metrics)
+            elif changed:
+                self.evaluator = self._recompile(touched)
+        self.epoch = response['epoch']
+        self.seq = response['seq']
+        return changed
+
+    def _recompile(self, flag_names):
+        evaluator = copy.copy(self.evaluator)
+        evaluator.version = self.document.get('version')
+        evaluator.last_updated = self.document.get('lastUpdated')
+        # Walk the document so flag order matches a fresh FlagEvaluator
+        previous = self.evaluator.flags
+        evaluator.flags = {
+            name: previous[name] if name in previous and name not in flag_names else CompiledFlag(name, definition)
+            for name, definition in (self.document.get('flags') or {}).items()
+        }
+        return evaluator
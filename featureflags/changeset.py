@@ -0,0 +1,387 @@
+"""Bulk flag mutations committed as one feature-flags.json version.
+
+createOrUpdateFeatureFlag, deleteFeatureFlag and updateRolloutPercentage each
+write a new version, and each version needs its own AppConfig deployment. A
+changeset holds any number of these operations. commit_changeset() validates
+the whole changeset up front; the rollout and variant checks run as array
+operations across every touched flag. It then applies all operations with one
+generateVersion()/lastUpdated, writes the file atomically, and returns the
+RFC 6902 diff from the previous document.
+
+A changeset is a list, or {"changes": [...]}, of:
+
+    {"op": "upsert", "flagName": "...", "flag": {...flag definition...}}
+    {"op": "rollout", "flagName": "...", "percentage": 50}
+    {"op": "delete", "flagName": "..."}
+"""
+
+import argparse
+import collections
+import copy
+import datetime
+import json
+import logging
+import math
+import os
+import tempfile
+
+from .changelog import json_diff
+from .evaluator import DEFAULT_FLAGS_FILE, load_flags
+
+logger = logging.getLogger(__name__)
+
+UPSERT = 'upsert'
+ROLLOUT = 'rollout'
+DELETE = 'delete'
+OPERATIONS = (UPSERT, ROLLOUT, DELETE)
+
+ChangesetResult = collections.namedtuple('ChangesetResult', 'document patch created updated deleted warnings')
+
+
+class ChangesetError(ValueError):
+    """Every invalid entry of a changeset; nothing has been written."""
+
+    def __init__(self, errors):
+        self.errors = errors
+        lines = [f"#{e['index']} {e['op']} {e['flagName']!r}: {e['message']}" for e in errors]
+        super().__init__(f'{len(errors)} invalid change(s):\n' + '\n'.join(lines))
+
+
+class VersionConflict(RuntimeError):
+    pass
+
+
+def _iso(moment):
+    """Date.prototype.toISOString() of an aware datetime."""
+    return moment.isoformat(timespec='milliseconds').replace('+00:00', 'Z')
+
+
+def generate_version(moment):
+    """Port of generateVersion(); minutes are not zero-padded, as in the JS."""
+    return f'{moment.year}.{moment.month}.{moment.day}.{moment.hour}{moment.minute}'
+
+
+def _truthy(value):
+    """JavaScript truthiness: empty lists and objects are true, 0, '' and NaN are not."""
+    if value is None or value is False or value == '':
+        return False
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return value != 0 and not math.isnan(value)
+    return True
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def validate_feature_flag(flag_data, now=None):
+    """Port of validateFeatureFlag(): the normalised flag, or ValueError with the JS message."""
+    for field in ('enabled', 'rolloutPercentage'):
+        if flag_data.get(field) is None:
+            raise ValueError(f"Required field '{field}' is missing")
+    if flag_data['rolloutPercentage'] < 0 or flag_data['rolloutPercentage'] > 100:
+        raise ValueError('Rollout percentage must be between 0 and 100')
+    variants = flag_data.get('variants')
+    if variants:
+        for variant in variants:
+            if not _truthy(variant.get('name')) or not _is_number(variant.get('weight')):
+                raise ValueError('Invalid variant configuration')
+    message = _targeting_error(flag_data.get('targeting')) or _metadata_error(flag_data.get('metadata'))
+    if message:
+        raise ValueError(message)
+
+    metadata = flag_data.get('metadata') or {}
+    created_at = _iso(now or datetime.datetime.now(datetime.timezone.utc))
+    return {
+        'enabled': _truthy(flag_data['enabled']),
+        'rolloutPercentage': flag_data['rolloutPercentage'],
+        'targeting': flag_data['targeting'] if _truthy(flag_data.get('targeting'))
+        else {'userGroups': [], 'userIds': []},
+        'variants': variants if _truthy(variants) else [{'name': 'control', 'weight': 100}],
+        'metadata': {
+            'description': metadata.get('description') if _truthy(metadata.get('description')) else '',
+            'owner': metadata.get('owner') if _truthy(metadata.get('owner')) else 'unknown',
+            'createdAt': metadata.get('createdAt') if _truthy(metadata.get('createdAt')) else created_at,
+            **metadata,
+        },
+    }
+
+
+def _targeting_error(targeting):
+    """The route schema's check of targeting; FlagEvaluator needs lists of strings."""
+    if targeting is None:
+        return None
+    if not isinstance(targeting, dict):
+        return '"targeting" must be of type object'
+    for field in ('userIds', 'userGroups'):
+        values = targeting.get(field)
+        if values is not None and not (isinstance(values, list) and all(isinstance(v, str) for v in values)):
+            return f'"targeting.{field}" must be an array of strings'
+    return None
+
+
+def _metadata_error(metadata):
+    if metadata is not None and not isinstance(metadata, dict):
+        return '"metadata" must be of type object'
+    return None
+
+
+def load_changeset(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    return data['changes'] if isinstance(data, dict) else data
+
+
+def _resolve(document, changes):
+    """Walk the changes in order; returns (errors, [(index, flag name, definition to validate)])."""
+    errors = []
+    candidates = []
+    flags = dict(document.get('flags') or {})
+
+    def error(index, change, message):
+        errors.append({'index': index, 'op': change.get('op'), 'flagName': change.get('flagName'),
+                       'message': message})
+
+    for index, change in enumerate(changes):
+        if not isinstance(change, dict):
+            errors.append({'index': index, 'op': None, 'flagName': None, 'message': 'Change must be an object'})
+            continue
+        op, name = change.get('op'), change.get('flagName')
+        if op not in OPERATIONS:
+            error(index, change, f'"op" must be one of [{", ".join(OPERATIONS)}]')
+        elif not isinstance(name, str) or not name:
+            error(index, change, '"flagName" is required')
+        elif op == UPSERT:
+            if not isinstance(change.get('flag'), dict):
+                error(index, change, '"flag" must be of type object')
+                continue
+            flags[name] = change['flag']
+            candidates.append((index, name, change['flag']))
+        elif name not in flags:
+            error(index, change, f"Feature flag '{name}' not found")
+        elif op == DELETE:
+            del flags[name]
+        else:
+            percentage = change.get('percentage')
+            if not _is_number(percentage):
+                error(index, change, '"percentage" must be a number')
+                continue
+            # updateRolloutPercentage saves through createOrUpdateFeatureFlag, so the whole flag is revalidated
+            flags[name] = {**flags[name], 'rolloutPercentage': percentage}
+            candidates.append((index, name, flags[name]))
+    return errors, candidates
+
+
+def validate_changeset(document, changes):
+    """Check every change against document in one pass; returns (errors, warnings).
+
+    Each upserted or re-rolled flag gets the checks of the POST /:flagName
+    route schema and of validateFeatureFlag, and reports the first one it
+    fails, in that order. Variant weights that do not add up to 100 produce
+    warnings only, because evaluation does not require it.
+    """
+    try:
+        import numpy as np
+    except ImportError:
+        raise ImportError('validate_changeset requires numpy. Please run: pip install numpy')
+
+    errors, candidates = _resolve(document, changes)
+    warnings = []
+    count = len(candidates)
+    if not count:
+        return errors, warnings
+
+    definitions = [definition for _, _, definition in candidates]
+    enabled = [definition.get('enabled') for definition in definitions]
+    rollouts = [definition.get('rolloutPercentage') for definition in definitions]
+    missing_enabled = np.array([value is None for value in enabled])
+    missing_rollout = np.array([value is None for value in rollouts])
+    enabled_type = missing_enabled | np.array([isinstance(value, bool) for value in enabled])
+    rollout_type = missing_rollout | np.array([_is_number(value) for value in rollouts])
+    percentage = np.array([value if _is_number(value) else np.nan for value in rollouts], dtype=float)
+    with np.errstate(invalid='ignore'):
+        out_of_range = (percentage < 0) | (percentage > 100)
+
+    # Every variant of every candidate flattened, with owner mapping it back to its flag
+    variant_lists = [definition.get('variants') for definition in definitions]
+    variants_type = np.array([value is None or isinstance(value, list) for value in variant_lists])
+    lengths = np.array([len(value) if isinstance(value, list) else 0 for value in variant_lists])
+    owner = np.repeat(np.arange(count), lengths)
+    flat = [variant for value in variant_lists if isinstance(value, list) for variant in value]
+    is_object = np.array([isinstance(variant, dict) for variant in flat], dtype=bool)
+    names = [variant.get('name') if isinstance(variant, dict) else None for variant in flat]
+    weights = [variant.get('weight') if isinstance(variant, dict) else None for variant in flat]
+    name_ok = is_object & np.array([_truthy(name) for name in names], dtype=bool)
+    weight_ok = np.array([_is_number(weight) for weight in weights], dtype=bool)
+    weight = np.array([w if _is_number(w) else np.nan for w in weights], dtype=float)
+
+    invalid_variant = np.zeros(count, dtype=bool)
+    np.logical_or.at(invalid_variant, owner, ~(name_ok & weight_ok))
+    negative = np.zeros(count, dtype=bool)
+    with np.errstate(invalid='ignore'):
+        np.logical_or.at(negative, owner, weight < 0)
+    totals = np.bincount(owner, weights=np.nan_to_num(weight), minlength=count)
+    uneven = (lengths > 0) & ~invalid_variant & ~np.isclose(totals, 100)
+
+    targeting_errors = [_targeting_error(definition.get('targeting')) for definition in definitions]
+    metadata_errors = [_metadata_error(definition.get('metadata')) for definition in definitions]
+    invalid_targeting = np.array([message is not None for message in targeting_errors])
+    invalid_metadata = np.array([message is not None for message in metadata_errors])
+
+    checks = (
+        (missing_enabled, lambda i: "Required field 'enabled' is missing"),
+        (missing_rollout, lambda i: "Required field 'rolloutPercentage' is missing"),
+        (~enabled_type, lambda i: '"enabled" must be a boolean'),
+        (~rollout_type, lambda i: '"rolloutPercentage" must be a number'),
+        (out_of_range, lambda i: 'Rollout percentage must be between 0 and 100'),
+        (invalid_targeting, lambda i: targeting_errors[i]),
+        (~variants_type, lambda i: '"variants" must be an array'),
+        (invalid_variant, lambda i: 'Invalid variant configuration'),
+        (negative, lambda i: '"weight" must be greater than or equal to 0'),
+        (invalid_metadata, lambda i: metadata_errors[i]),
+    )
+    failed = np.zeros(count, dtype=bool)
+    for mask, message in checks:
+        for i in np.flatnonzero(mask & ~failed):
+            index, name, _ = candidates[i]
+            errors.append({'index': index, 'op': changes[index]['op'], 'flagName': name, 'message': message(i)})
+        failed |= mask
+    for i in np.flatnonzero(uneven & ~failed):
+        index, name, _ = candidates[i]
+        warnings.append({'index': index, 'op': changes[index]['op'], 'flagName': name,
+                         'message': f'Variant weights sum to {totals[i]:g}, not 100'})
+    errors.sort(key=lambda e: e['index'])
+    return errors, warnings
+
+
+def apply_changeset(document, changes, now=None):
+    """The new document and its diff from document, or ChangesetError before anything changes."""
+    errors, warnings = validate_changeset(document, changes)
+    if errors:
+        raise ChangesetError(errors)
+
+    now = now or datetime.datetime.now(datetime.timezone.utc)
+    timestamp = _iso(now)
+    new = copy.deepcopy(document)
+    flags = new.setdefault('flags', {})
+    for change in changes:
+        name = change['flagName']
+        if change['op'] == DELETE:
+            del flags[name]
+            continue
+        if change['op'] == ROLLOUT:
+            flag_data = {**flags[name], 'rolloutPercentage': change['percentage']}
+        else:
+            flag_data = copy.deepcopy(change['flag'])
+        validated = validate_feature_flag(flag_data, now)
+        # createOrUpdateFeatureFlag stamps metadata.lastUpdated on every save
+        flags[name] = {**validated, 'metadata': {**validated['metadata'], 'lastUpdated': timestamp}}
+
+    if changes:
+        new['version'] = generate_version(now)
+        new['lastUpdated'] = timestamp
+    previous = document.get('flags') or {}
+    created = [name for name in flags if name not in previous]
+    updated = [name for name in flags if name in previous and previous[name] != flags[name]]
+    deleted = [name for name in previous if name not in flags]
+    return ChangesetResult(new, json_diff(document, new), created, updated, deleted, warnings)
+
+
+def write_document(document, path=DEFAULT_FLAGS_FILE):
+    """Replace path with document in one rename, formatted like JSON.stringify(config, null, 2)."""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.feature-flags-')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(document, f, ensure_ascii=False, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def commit_changeset(changes, path=DEFAULT_FLAGS_FILE, expect_version=None, changelog=None, now=None,
+                     dry_run=False):
+    """Apply changes to the document at path as one version and write it back.
+
+    expect_version guards against lost updates: the commit fails with
+    VersionConflict if the file no longer has that version. A ChangeLog, when
+    given, records the whole changeset as a single delta.
+    """
+    document = load_flags(path)
+    if expect_version is not None and document.get('version') != expect_version:
+        raise VersionConflict(f"{path} is at version {document.get('version')!r}, not {expect_version!r}")
+    result = apply_changeset(document, changes, now)
+    if dry_run or not result.patch:
+        return result
+    write_document(result.document, path)
+    if changelog is not None:
+        if changelog.document is None:
+            # Seed an empty log so this commit is recorded as a delta rather than as the base
+            changelog.record(document)
+        changelog.record(result.document)
+    logger.info('Committed %d change(s) as version %s (%d patch operations)',
+                len(changes), result.document.get('version'), len(result.patch))
+    return result
+
+
+def _assignment(value):
+    flag_name, separator, percentage = value.rpartition('=')
+    if not separator or not flag_name:
+        raise argparse.ArgumentTypeError(f'expected FLAG=PERCENTAGE, got {value!r}')
+    try:
+        return flag_name, float(percentage) if '.' in percentage else int(percentage)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f'expected FLAG=PERCENTAGE, got {value!r}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Apply many flag changes as one feature-flags.json version')
+    parser.add_argument('--flags', default=DEFAULT_FLAGS_FILE, help='feature-flags.json to update')
+    parser.add_argument('--changeset', help='JSON file with the list of changes')
+    parser.add_argument('--rollout', type=_assignment, action='append', default=[], metavar='FLAG=PERCENTAGE',
+                        help='Set a rollout percentage (repeatable)')
+    parser.add_argument('--delete', action='append', default=[], metavar='FLAG', help='Delete a flag (repeatable)')
+    parser.add_argument('--expect-version', help='Fail unless the file is still at this version')
+    parser.add_argument('--changelog', help='ChangeLog directory to record the commit in')
+    parser.add_argument('--dry-run', action='store_true', help='Validate and print the diff without writing')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+    changes = load_changeset(args.changeset) if args.changeset else []
+    changes += [{'op': ROLLOUT, 'flagName': name, 'percentage': percentage} for name, percentage in args.rollout]
+    changes += [{'op': DELETE, 'flagName': name} for name in args.delete]
+    if not changes:
+        parser.error('nothing to do: pass --changeset, --rollout or --delete')
+
+    changelog = None
+    if args.changelog:
+        from .changelog import ChangeLog
+        changelog = ChangeLog(args.changelog)
+    try:
+        result = commit_changeset(changes, args.flags, args.expect_version, changelog, dry_run=args.dry_run)
+    except (ChangesetError, VersionConflict) as e:
+        parser.exit(1, f'{e}\n')
+
+    for warning in result.warnings:
+        logger.warning('#%d %r: %s', warning['index'], warning['flagName'], warning['message'])
+    summary = {
+        'version': result.document.get('version'),
+        'lastUpdated': result.document.get('lastUpdated'),
+        'created': result.created,
+        'updated': result.updated,
+        'deleted': result.deleted,
+        'operations': len(result.patch),
+        'written': not args.dry_run and bool(result.patch),
+    }
+    if args.dry_run:
+        summary['patch'] = result.patch
+    print(json.dumps(summary, ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
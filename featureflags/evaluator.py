@@ -0,0 +1,210 @@
+"""In-process flag evaluation matching backend/src/services/featureFlags.js."""
+
+import bisect
+import json
+import logging
+import os
+import struct
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_FLAGS_FILE = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    'aws-config', 'appconfig', 'feature-flags.json',
+)
+
+UINT32_MASK = 0xFFFFFFFF
+VARIANT_SALT_SUFFIX = '-variant'
+
+
+def _code_units(text):
+    """UTF-16 code units of text, the values String.prototype.charCodeAt returns."""
+    if text.isascii():
+        return text.encode('ascii')
+    data = text.encode('utf-16-le')
+    return struct.unpack(f'<{len(data) // 2}H', data)
+
+
+def string_hash(text, seed=0):
+    """Unsigned 32-bit form of the ((hash << 5) - hash) + char loop in hashUserId."""
+    h = seed
+    for unit in _code_units(text):
+        h = (h * 31 + unit) & UINT32_MASK
+    return h
+
+
+def js_abs(h):
+    """Math.abs() of an unsigned 32-bit hash reinterpreted as a signed int32."""
+    return 0x100000000 - h if h & 0x80000000 else h
+
+
+def salt_params(salt):
+    """Multiplier and addend that extend any prefix hash by salt.
+
+    hash(prefix + salt) == hash(prefix) * 31**len(salt) + hash(salt)  (mod 2**32)
+    """
+    units = _code_units(salt)
+    return pow(31, len(units), 0x100000000), string_hash(salt)
+
+
+def hash_user_id(user_id, salt=''):
+    """Port of hashUserId(userId, salt); results match the Node.js service bit for bit."""
+    return js_abs(string_hash(str(user_id) + salt))
+
+
+class CompiledFlag:
+    """A flag definition precompiled for O(1) targeting and O(log n) variant selection."""
+
+    __slots__ = (
+        'name', 'enabled', 'rollout_percentage', 'user_ids', 'user_groups',
+        'rollout_mult', 'rollout_add', 'variant_mult', 'variant_add',
+        'variant_names', 'cumulative_weights', 'total_weight', 'linear_variants', 'definition',
+    )
+
+    def __init__(self, name, definition):
+        self.name = name
+        self.definition = definition
+        self.enabled = bool(definition.get('enabled'))
+
+        # `undefined < 100` is false in JS, so a missing percentage never limits rollout
+        rollout = definition.get('rolloutPercentage')
+        self.rollout_percentage = 100 if rollout is None else rollout
+
+        targeting = definition.get('targeting') or {}
+        self.user_ids = frozenset(targeting.get('userIds') or ())
+        groups = targeting.get('userGroups') or ()
+        self.user_groups = frozenset(groups) if groups else None
+
+        self.rollout_mult, self.rollout_add = salt_params(name)
+        self.variant_mult, self.variant_add = salt_params(name + VARIANT_SALT_SUFFIX)
+
+        variants = definition.get('variants') or []
+        self.variant_names = tuple(variant['name'] for variant in variants)
+        cumulative = []
+        total = 0
+        for variant in variants:
+            # Same left-to-right summation as the JS reduce/loop, including float weights
+            total += variant['weight']
+            cumulative.append(total)
+        self.cumulative_weights = tuple(cumulative)
+        self.total_weight = total
+        # bisect needs non-decreasing sums; negative weights fall back to the JS scan
+        self.linear_variants = any(variant['weight'] < 0 for variant in variants)
+
+    def is_enabled(self, user_id, user_groups=(), user_hash=None):
+        """Mirror of isFeatureEnabled for an already resolved flag."""
+        if not self.enabled:
+            return False
+
+        if user_id in self.user_ids:
+            return True
+
+        if self.user_groups is not None and self.user_groups.isdisjoint(user_groups):
+            return False
+
+        if self.rollout_percentage < 100:
+            if user_hash is None:
+                user_hash = string_hash(str(user_id))
+            bucket = js_abs((user_hash * self.rollout_mult + self.rollout_add) & UINT32_MASK)
+            if bucket % 100 >= self.rollout_percentage:
+                return False
+
+        return True
+
+    def choose_variant(self, user_id, user_hash=None):
+        """Mirror of the variant selection in getFeatureVariant, assuming the flag is enabled."""
+        names = self.variant_names
+        if not names:
+            return 'control'
+        if len(names) == 1:
+            return names[0]
+
+        if user_hash is None:
+            user_hash = string_hash(str(user_id))
+        total = self.total_weight
+        if total == 0 or total != total:
+            # userHash % 0 (or % NaN) is NaN in JS and no variant matches
+            return names[0]
+        # JS % takes the sign of the non-negative hash, so a negative total acts as its absolute value
+        weight = js_abs((user_hash * self.variant_mult + self.variant_add) & UINT32_MASK) % abs(total)
+
+        if self.linear_variants:
+            for name, cumulative in zip(names, self.cumulative_weights):
+                if weight < cumulative:
+                    return name
+            return names[0]
+
+        index = bisect.bisect_right(self.cumulative_weights, weight)
+        return names[index] if index < len(names) else names[0]
+
+
+def load_flags(path=DEFAULT_FLAGS_FILE):
+    """Load a feature-flags.json document."""
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+class FlagEvaluator:
+    """Evaluates flags from a feature-flags.json document without calling the backend API."""
+
+    def __init__(self, document, metrics=None):
+        # metrics: optional MetricsAggregator counting every evaluation
+        self.metrics = metrics
+        self.version = document.get('version')
+        self.last_updated = document.get('lastUpdated')
+        self.flags = {
+            name: CompiledFlag(name, definition)
+            for name, definition in (document.get('flags') or {}).items()
+        }
+
+    @classmethod
+    def from_file(cls, path=DEFAULT_FLAGS_FILE, metrics=None):
+        return cls(load_flags(path), metrics)
+
+    def get_flag(self, flag_name):
+        return self.flags.get(flag_name)
+
+    def _resolve(self, flag_name):
+        flag = self.flags.get(flag_name)
+        if flag is None:
+            logger.warning("Feature flag '%s' not found", flag_name)
+        return flag
+
+    def is_enabled(self, flag_name, user_id, user_groups=(), user_attributes=None):
+        """Check if feature flag is enabled for user."""
+        flag = self._resolve(flag_name)
+        if flag is None:
+            return False
+        enabled = flag.is_enabled(user_id, user_groups)
+        if self.metrics is not None:
+            self.metrics.record(flag_name, enabled)
+        return enabled
+
+    def get_variant(self, flag_name, user_id, user_groups=(), user_attributes=None):
+        """Get feature flag variant for A/B testing, or None when the flag is off."""
+        return self.evaluate(flag_name, user_id, user_groups, user_attributes)['variant']
+
+    def evaluate(self, flag_name, user_id, user_groups=(), user_attributes=None, user_hash=None):
+        """Return {'enabled', 'variant'} as the /:flagName/evaluate route does, hashing the user once."""
+        flag = self._resolve(flag_name)
+        if flag is None:
+            return {'enabled': False, 'variant': None}
+        if user_hash is None:
+            user_hash = string_hash(str(user_id))
+        if not flag.is_enabled(user_id, user_groups, user_hash):
+            result = {'enabled': False, 'variant': None}
+        else:
+            result = {'enabled': True, 'variant': flag.choose_variant(user_id, user_hash)}
+        if self.metrics is not None:
+            self.metrics.record(flag_name, result['enabled'], result['variant'])
+        return result
+
+    def evaluate_many(self, flag_names, user_id, user_groups=(), user_attributes=None):
+        """Return the `results` object of /batch-evaluate for one user."""
+        user_hash = string_hash(str(user_id))
+        if not isinstance(user_groups, (set, frozenset)):
+            user_groups = frozenset(user_groups)
+        return {
+            name: self.evaluate(name, user_id, user_groups, user_attributes, user_hash)
+            for name in flag_names
+        }
@@ -0,0 +1,632 @@
+"""Append-only columnar log of evaluation exposures and outcome events.
+
+Each event is a row of six columns: timestamp (ms), the 32-bit string_hash of
+the user id, a key, a variant, a kind and a value. For an exposure the key is
+the flag name; for an outcome such as a conversion it is the outcome name.
+Keys and variants are dictionary-encoded through dictionary.json. Rows go to
+fixed-capacity, memory-mapped segment files, one contiguous array per column,
+and a new segment is started when the current one is full.
+
+One process writes a log directory and any number of processes may query it.
+Full segments never change again, so each one is summarised once into counts
+per (minute, key, variant, kind). Exposure queries read those summaries and
+scan raw rows only in the segment still being written and in partially
+covered minutes. The scan cost therefore grows with the number of flags and
+minutes, not with the number of events.
+"""
+
+try:
+    import numpy as np
+except ImportError:
+    raise ImportError('featureflags.events requires numpy. Please run: pip install numpy')
+
+import argparse
+import collections
+import datetime
+import itertools
+import json
+import logging
+import mmap
+import os
+import re
+import struct
+import tempfile
+import threading
+import time
+
+from .evaluator import string_hash
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'FFEVTS\x00\x00'
+FORMAT_VERSION = 1
+# magic, version, capacity, committed rows, min timestamp, max timestamp
+HEADER = struct.Struct('<8sIIQqq')
+HEADER_SIZE = 64
+DEFAULT_SEGMENT_ROWS = 1 << 20
+DEFAULT_FLUSH_INTERVAL = 1.0
+DICTIONARY_FILE = 'dictionary.json'
+SEGMENT_FILE = re.compile(r'^segment-(\d{8})\.events$')
+MINUTE_MS = 60_000
+
+EXPOSURE = 0
+OUTCOME = 1
+NO_VARIANT = 0xFFFF
+MAX_KEYS = 1 << 20
+# Keys and variants past the dictionary's capacity share its last code
+OVERFLOW = '(overflow)'
+DEFAULT_MAX_PENDING = 1 << 20
+
+COLUMNS = (
+    ('timestamp', np.int64),
+    ('user', np.uint32),
+    ('key', np.uint32),
+    ('variant', np.uint16),
+    ('kind', np.uint8),
+    ('value', np.float64),
+)
+
+_INT64 = np.iinfo(np.int64)
+
+
+def _now_ms():
+    return time.time_ns() // 1_000_000
+
+
+def to_ms(value):
+    """Milliseconds since the epoch of a datetime, an ISO 8601 string or a number of ms."""
+    if value is None or isinstance(value, (int, float)):
+        return value
+    if isinstance(value, str):
+        value = datetime.datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=datetime.timezone.utc)
+    return int(value.timestamp() * 1000)
+
+
+def _iso(ms):
+    moment = datetime.datetime.fromtimestamp(ms / 1000, datetime.timezone.utc)
+    return moment.isoformat(timespec='milliseconds').replace('+00:00', 'Z')
+
+
+def _layout(capacity):
+    offsets = {}
+    offset = HEADER_SIZE
+    for name, dtype in COLUMNS:
+        offsets[name] = offset
+        offset += -(-capacity * np.dtype(dtype).itemsize // 8) * 8
+    return offsets, offset
+
+
+def summarise(columns):
+    """Event counts and value sums per distinct (minute, key, variant, kind)."""
+    minutes = columns['timestamp'] // MINUTE_MS
+    base = int(minutes.min())
+    span = int(minutes.max()) - base + 1
+    keys = int(columns['key'].max()) + 1
+    variant = columns['variant'].astype(np.int64)
+    variants = int(variant[variant != NO_VARIANT].max(initial=-1)) + 2
+    # NO_VARIANT takes the slot after the last real variant code
+    variant[variant == NO_VARIANT] = variants - 1
+    size = span * keys * variants * 2
+    if size <= 4 * len(minutes):
+        # Few distinct combinations: one counting pass instead of a sort
+        packed = ((minutes - base) * keys + columns['key']) * variants * 2 + variant * 2 + columns['kind']
+        counts = np.bincount(packed, minlength=size)
+        codes = np.flatnonzero(counts)
+        values = np.bincount(packed, weights=columns['value'], minlength=size)[codes]
+        counts = counts[codes]
+    else:
+        packed = ((minutes - base) << 37) | (columns['key'].astype(np.int64) << 17) | (variant << 1) \
+            | columns['kind']
+        unique, inverse, counts = np.unique(packed, return_inverse=True, return_counts=True)
+        values = np.bincount(inverse.ravel(), weights=columns['value'], minlength=len(unique))
+        codes = (unique >> 37) * (keys * variants * 2) + ((unique >> 17) & (MAX_KEYS - 1)) * variants * 2 \
+            + ((unique >> 1) & 0xFFFF) * 2 + (unique & 1)
+    variant = codes // 2 % variants
+    return {
+        'minute': codes // (keys * variants * 2) + base,
+        'key': codes // (variants * 2) % keys,
+        'variant': np.where(variant == variants - 1, NO_VARIANT, variant),
+        'kind': codes % 2,
+        'count': counts,
+        'value': values,
+    }
+
+
+class Segment:
+    """One memory-mapped segment file; the header's row count commits appended rows."""
+
+    def __init__(self, path, capacity=None):
+        self.path = path
+        self.summary_path = path[:-len('.events')] + '.summary.npz'
+        self.writable = capacity is not None
+        if self.writable and not os.path.exists(path):
+            # Readers list the directory, so a segment only appears once it has its full size
+            _, size = _layout(capacity)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.segment-')
+            with os.fdopen(fd, 'wb') as f:
+                f.write(HEADER.pack(MAGIC, FORMAT_VERSION, capacity, 0, 0, 0).ljust(HEADER_SIZE, b'\x00'))
+                f.truncate(size)
+            os.replace(tmp_path, path)
+        with open(path, 'r+b' if self.writable else 'rb') as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_WRITE if self.writable else mmap.ACCESS_READ)
+        magic, version, self.capacity, _, _, _ = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            raise ValueError(f'{path} is not a version {FORMAT_VERSION} event segment')
+        offsets, _ = _layout(self.capacity)
+        self._columns = {
+            name: np.frombuffer(self._mm, dtype=dtype, count=self.capacity, offset=offsets[name])
+            for name, dtype in COLUMNS
+        }
+
+    def header(self):
+        _, _, _, rows, low, high = HEADER.unpack_from(self._mm, 0)
+        return rows, low, high
+
+    @property
+    def rows(self):
+        return self.header()[0]
+
+    def columns(self, rows=None):
+        rows = self.rows if rows is None else rows
+        return {name: column[:rows] for name, column in self._columns.items()}
+
+    def append(self, columns, start, stop):
+        """Copy rows start:stop of columns, then commit them in the header."""
+        rows, low, high = self.header()
+        count = stop - start
+        for name, column in self._columns.items():
+            column[rows:rows + count] = columns[name][start:stop]
+        timestamps = columns['timestamp'][start:stop]
+        if rows:
+            low, high = min(low, int(timestamps.min())), max(high, int(timestamps.max()))
+        else:
+            low, high = int(timestamps.min()), int(timestamps.max())
+        HEADER.pack_into(self._mm, 0, MAGIC, FORMAT_VERSION, self.capacity, rows + count, low, high)
+        return count
+
+
+class EventLog:
+    """Writer and query API over a directory of event segments.
+
+    record_* calls only append a tuple to a queue of at most max_pending rows;
+    events arriving while it is full are counted in dropped. flush(), run by a
+    background thread once start() is called, encodes the queued events and
+    appends them to the segment files.
+    """
+
+    def __init__(self, directory, segment_rows=DEFAULT_SEGMENT_ROWS, max_segments=None,
+                 flush_interval=DEFAULT_FLUSH_INTERVAL, max_pending=DEFAULT_MAX_PENDING):
+        self.directory = directory
+        self.segment_rows = segment_rows
+        self.max_segments = max_segments
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.dropped = 0
+        self._dropped_logged = 0
+        self.names = []
+        self.variants = []
+        self._name_codes = {}
+        self._variant_codes = {}
+        self._dictionary_identity = None
+        self._dictionary_dirty = False
+        self._segments = {}
+        self._writer = None
+        self._summaries = {}
+        self._pending = collections.deque()
+        self._lock = threading.RLock()
+        self._stop = threading.Event()
+        self._thread = None
+        os.makedirs(directory, exist_ok=True)
+        self.refresh()
+
+    # Dictionary and segment files
+
+    @property
+    def dictionary_path(self):
+        return os.path.join(self.directory, DICTIONARY_FILE)
+
+    def _segment_path(self, number):
+        return os.path.join(self.directory, f'segment-{number:08d}.events')
+
+    def _segment_numbers(self):
+        numbers = []
+        for name in os.listdir(self.directory):
+            match = SEGMENT_FILE.match(name)
+            if match:
+                numbers.append(int(match.group(1)))
+        return sorted(numbers)
+
+    def refresh(self):
+        """Pick up segments and dictionary entries another process has written."""
+        with self._lock:
+            try:
+                stat = os.stat(self.dictionary_path)
+                identity = (stat.st_ino, stat.st_mtime_ns)
+            except FileNotFoundError:
+                identity = None
+            if identity is not None and identity != self._dictionary_identity and not self._dictionary_dirty:
+                with open(self.dictionary_path, 'r', encoding='utf-8') as f:
+                    dictionary = json.load(f)
+                self.names = dictionary['names']
+                self.variants = dictionary['variants']
+                self._name_codes = {name: i for i, name in enumerate(self.names)}
+                self._variant_codes = {name: i for i, name in enumerate(self.variants)}
+                self._dictionary_identity = identity
+
+            numbers = self._segment_numbers()
+            for number in list(self._segments):
+                if number not in numbers:
+                    self._summaries.pop(self._segments.pop(number).path, None)
+            for number in numbers:
+                if number not in self._segments:
+                    self._segments[number] = Segment(self._segment_path(number))
+
+    def _write_dictionary(self):
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix='.dictionary-')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump({'names': self.names, 'variants': self.variants}, f, ensure_ascii=False)
+        os.replace(tmp_path, self.dictionary_path)
+        stat = os.stat(self.dictionary_path)
+        self._dictionary_identity = (stat.st_ino, stat.st_mtime_ns)
+        self._dictionary_dirty = False
+
+    def _encode(self, value, codes, table, limit):
+        code = codes.get(value)
+        if code is None:
+            code = len(table)
+            if code >= limit - 1:
+                # Names come from clients, so a full dictionary must not stop the writer
+                if OVERFLOW not in codes:
+                    logger.warning('Event log dictionary is full (%d entries); recording new names as %r',
+                                   limit, OVERFLOW)
+                    codes[OVERFLOW] = code
+                    table.append(OVERFLOW)
+                    self._dictionary_dirty = True
+                return codes[OVERFLOW]
+            codes[value] = code
+            table.append(value)
+            self._dictionary_dirty = True
+        return code
+
+    def _writable_segment(self):
+        if self._writer is not None and self._writer.rows < self._writer.capacity:
+            return self._writer
+        numbers = self._segment_numbers()
+        if self._writer is None and numbers:
+            # Resume the last segment left by a previous writer
+            last = Segment(self._segment_path(numbers[-1]), self.segment_rows)
+            if last.rows < last.capacity:
+                self._segments[numbers[-1]] = self._writer = last
+                return last
+        number = numbers[-1] + 1 if numbers else 1
+        self._segments[number] = self._writer = Segment(self._segment_path(number), self.segment_rows)
+        if self.max_segments is not None:
+            for old in numbers[:max(0, len(numbers) + 1 - self.max_segments)]:
+                segment = self._segments.pop(old)
+                os.remove(segment.path)
+                if os.path.exists(segment.summary_path):
+                    os.remove(segment.summary_path)
+                self._summaries.pop(segment.path, None)
+        return self._writer
+
+    # Recording
+
+    def record_evaluation(self, flag_name, user_id, variant=None, timestamp=None, user_hash=None):
+        """One exposure; variant is None when the flag was off for the user."""
+        if len(self._pending) >= self.max_pending:
+            self.dropped += 1
+            return
+        if user_hash is None:
+            user_hash = string_hash(str(user_id))
+        self._pending.append((_now_ms() if timestamp is None else to_ms(timestamp), user_hash, flag_name, variant,
+                              EXPOSURE, 0.0))
+
+    def record_results(self, user_id, results, timestamp=None):
+        """Exposures for an evaluate_many / batch-evaluate `results` object."""
+        if len(self._pending) + len(results) > self.max_pending:
+            self.dropped += len(results)
+            return
+        timestamp = _now_ms() if timestamp is None else to_ms(timestamp)
+        user_hash = string_hash(str(user_id))
+        append = self._pending.append
+        for flag_name, result in results.items():
+            append((timestamp, user_hash, flag_name, result['variant'] if result['enabled'] else None, EXPOSURE, 0.0))
+
+    def record_outcome(self, name, user_id, value=1.0, timestamp=None, user_hash=None):
+        """An outcome such as a conversion, attributed later to the variant the user saw."""
+        if len(self._pending) >= self.max_pending:
+            self.dropped += 1
+            return
+        if user_hash is None:
+            user_hash = string_hash(str(user_id))
+        self._pending.append((_now_ms() if timestamp is None else to_ms(timestamp), user_hash, name, None,
+                              OUTCOME, float(value)))
+
+    def flush(self):
+        """Write every queued event; returns the number of rows written."""
+        with self._lock:
+            if self.dropped != self._dropped_logged:
+                logger.warning('Event queue full (%d rows); dropped %d events', self.max_pending,
+                               self.dropped - self._dropped_logged)
+                self._dropped_logged = self.dropped
+            count = len(self._pending)
+            if not count:
+                return 0
+            # Rows leave the queue only once they are in a segment, so a failed flush is retried
+            rows = list(itertools.islice(self._pending, count))
+            timestamps, users, keys, variants, kinds, values = zip(*rows)
+            names, codes = self._name_codes, self._variant_codes
+            columns = {
+                'timestamp': np.array(timestamps, dtype=np.int64),
+                'user': np.array(users, dtype=np.uint32),
+                'key': np.fromiter((self._encode(key, names, self.names, MAX_KEYS) for key in keys),
+                                   dtype=np.uint32, count=count),
+                'variant': np.fromiter((NO_VARIANT if variant is None else
+                                        self._encode(variant, codes, self.variants, NO_VARIANT)
+                                        for variant in variants), dtype=np.uint16, count=count),
+                'kind': np.array(kinds, dtype=np.uint8),
+                'value': np.array(values, dtype=np.float64),
+            }
+            # Codes must be resolvable before the rows using them are committed
+            if self._dictionary_dirty:
+                self._write_dictionary()
+            written = 0
+            try:
+                while written < count:
+                    segment = self._writable_segment()
+                    written += segment.append(columns, written,
+                                              min(count, written + segment.capacity - segment.rows))
+                    if segment.rows == segment.capacity:
+                        # Summarise while the columns are still in the page cache
+                        self._summary(segment)
+            finally:
+                for _ in range(written):
+                    self._pending.popleft()
+            return count
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception:
+                # Keep the thread alive; the unwritten rows stay queued for the next attempt
+                logger.exception('Failed to flush %d queued events', len(self._pending))
+
+    def start(self):
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='featureflags-events', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop the flush thread and write whatever is still queued."""
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    # Queries
+
+    def _segment_list(self):
+        with self._lock:
+            return [self._segments[number] for number in sorted(self._segments)]
+
+    def _summary(self, segment):
+        """Counts and value sums per (minute, key, variant, kind) of a full segment."""
+        cached = self._summaries.get(segment.path)
+        if cached is not None:
+            return cached
+        try:
+            with np.load(segment.summary_path) as stored:
+                summary = dict(stored)
+        except FileNotFoundError:
+            summary = summarise(segment.columns())
+            try:
+                fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix='.summary-')
+                with os.fdopen(fd, 'wb') as f:
+                    np.savez(f, **summary)
+                os.replace(tmp_path, segment.summary_path)
+            except OSError:
+                pass  # a read-only reader keeps the summary in memory only
+        self._summaries[segment.path] = summary
+        return summary
+
+    def _aggregate(self, key, kind, start, end, period_ms, origin):
+        """(bucket, variant) -> [events, value sum] for one key over [start, end)."""
+        buckets, variants, counts, values = [], [], [], []
+
+        def add(timestamps, variant, count, value):
+            buckets.append(np.zeros(len(timestamps), dtype=np.int64) if period_ms is None
+                           else (timestamps - origin) // period_ms)
+            variants.append(variant)
+            counts.append(count)
+            values.append(value)
+
+        summarisable = period_ms is None or (period_ms % MINUTE_MS == 0 and origin % MINUTE_MS == 0)
+        # Whole minutes inside [start, end) come from summaries; the partial ones at either end are scanned
+        inner_start = -(-start // MINUTE_MS) * MINUTE_MS
+        inner_end = end // MINUTE_MS * MINUTE_MS
+        for segment in self._segment_list():
+            rows, low, high = segment.header()
+            if not rows or high < start or low >= end:
+                continue
+            full = rows == segment.capacity
+            if full and summarisable and inner_start < inner_end:
+                summary = self._summary(segment)
+                minute_ms = summary['minute'] * MINUTE_MS
+                mask = (summary['key'] == key) & (summary['kind'] == kind) \
+                    & (minute_ms >= inner_start) & (minute_ms < inner_end)
+                add(minute_ms[mask], summary['variant'][mask], summary['count'][mask], summary['value'][mask])
+                if low >= inner_start and high < inner_end:
+                    continue
+                columns = segment.columns(rows)
+                timestamps = columns['timestamp']
+                in_range = ((timestamps >= start) & (timestamps < inner_start)) \
+                    | ((timestamps >= inner_end) & (timestamps < end))
+            else:
+                columns = segment.columns(rows)
+                timestamps = columns['timestamp']
+                in_range = (timestamps >= start) & (timestamps < end)
+            mask = in_range & (columns['key'] == key) & (columns['kind'] == kind)
+            add(timestamps[mask], columns['variant'][mask], np.ones(int(mask.sum()), dtype=np.int64),
+                columns['value'][mask])
+
+        if not buckets:
+            return {}
+        bucket = np.concatenate(buckets)
+        variant = np.concatenate(variants).astype(np.int64)
+        packed, inverse = np.unique((bucket << 16) | variant, return_inverse=True)
+        inverse = inverse.ravel()
+        count = np.bincount(inverse, weights=np.concatenate(counts), minlength=len(packed))
+        value = np.bincount(inverse, weights=np.concatenate(values), minlength=len(packed))
+        return {
+            (int(code >> 16), int(code & 0xFFFF)): [int(n), float(v)]
+            for code, n, v in zip(packed, count, value)
+        }
+
+    def _range(self, start, end):
+        start, end = to_ms(start), to_ms(end)
+        return _INT64.min if start is None else start, _INT64.max if end is None else end
+
+    def exposures(self, flag_name, start=None, end=None, period=None):
+        """Exposures of flag_name per variant over [start, end), optionally per period seconds.
+
+        The answer to GET /api/feature-flags/:flagName/metrics: totals plus, with a
+        period, one datapoint per bucket. Buckets are aligned to start, rounded
+        down to the minute when period is whole minutes, or to the epoch.
+        """
+        self.refresh()
+        start, end = self._range(start, end)
+        period_ms = None if period is None else int(period * 1000)
+        if period_ms is not None and period_ms <= 0:
+            raise ValueError('period must be positive')
+        if start == _INT64.min:
+            origin = 0
+        elif period_ms is not None and period_ms % MINUTE_MS == 0:
+            # Whole-minute buckets start on a minute so summaries can fill them
+            origin = start // MINUTE_MS * MINUTE_MS
+        else:
+            origin = start
+        key = self._name_codes.get(flag_name)
+        aggregated = {} if key is None else self._aggregate(key, EXPOSURE, start, end, period_ms, origin)
+
+        def point(entries):
+            variants = {}
+            disabled = 0
+            for variant, (count, _) in entries:
+                if variant == NO_VARIANT:
+                    disabled += count
+                else:
+                    variants[self.variants[variant]] = variants.get(self.variants[variant], 0) + count
+            enabled = sum(variants.values())
+            return {'total': enabled + disabled, 'enabled': enabled, 'disabled': disabled, 'variants': variants}
+
+        result = {'flagName': flag_name, **point((variant, entry) for (_, variant), entry in aggregated.items())}
+        if period_ms is not None:
+            by_bucket = collections.defaultdict(list)
+            for (bucket, variant), entry in aggregated.items():
+                by_bucket[bucket].append((variant, entry))
+            result['datapoints'] = [
+                {'timestamp': _iso(origin + bucket * period_ms), **point(by_bucket[bucket])}
+                for bucket in sorted(by_bucket)
+            ]
+        return result
+
+    def _scan(self, key, kind, start, end, *names):
+        parts = {name: [] for name in names}
+        for segment in self._segment_list():
+            rows, low, high = segment.header()
+            if not rows or high < start or low >= end:
+                continue
+            columns = segment.columns(rows)
+            mask = (columns['key'] == key) & (columns['kind'] == kind)
+            if low < start or high >= end:
+                mask &= (columns['timestamp'] >= start) & (columns['timestamp'] < end)
+            for name in names:
+                parts[name].append(columns[name][mask])
+        return [np.concatenate(parts[name]) if parts[name] else np.zeros(0, dtype=dict(COLUMNS)[name])
+                for name in names]
+
+    def ab_results(self, flag_name, outcome, start=None, end=None):
+        """Users, converting users and outcome value per variant of flag_name.
+
+        Each user belongs to the variant of their first exposure in the range,
+        and counts as converted when an outcome event follows that exposure.
+        """
+        self.refresh()
+        start, end = self._range(start, end)
+        flag_key = self._name_codes.get(flag_name)
+        outcome_key = self._name_codes.get(outcome)
+        result = {'flagName': flag_name, 'outcome': outcome, 'variants': {}}
+        if flag_key is None:
+            return result
+        users, variants, timestamps = self._scan(flag_key, EXPOSURE, start, end, 'user', 'variant', 'timestamp')
+        order = np.lexsort((timestamps, users))
+        users, variants, timestamps = users[order], variants[order], timestamps[order]
+        first = np.flatnonzero(np.r_[True, users[1:] != users[:-1]]) if len(users) else np.zeros(0, dtype=np.int64)
+        first_users, first_variants, first_seen = users[first], variants[first], timestamps[first]
+        codes, groups = np.unique(first_variants, return_inverse=True)
+        groups = groups.ravel()
+        exposed = np.bincount(groups, minlength=len(codes))
+
+        converted = np.zeros(len(codes), dtype=np.int64)
+        value = np.zeros(len(codes))
+        conversions = np.zeros(len(codes), dtype=np.int64)
+        if outcome_key is not None and len(first_users):
+            out_users, out_timestamps, out_values = self._scan(outcome_key, OUTCOME, start, end,
+                                                               'user', 'timestamp', 'value')
+            position = np.minimum(np.searchsorted(first_users, out_users), len(first_users) - 1)
+            matched = (first_users[position] == out_users) & (out_timestamps >= first_seen[position])
+            position = position[matched]
+            conversions = np.bincount(groups[position], minlength=len(codes))
+            value = np.bincount(groups[position], weights=out_values[matched], minlength=len(codes))
+            converted = np.bincount(groups[np.unique(position)], minlength=len(codes))
+
+        for i, code in enumerate(codes):
+            name = 'disabled' if code == NO_VARIANT else self.variants[code]
+            result['variants'][name] = {
+                'users': int(exposed[i]),
+                'convertedUsers': int(converted[i]),
+                'conversionRate': float(converted[i] / exposed[i] * 100),
+                'conversions': int(conversions[i]),
+                'value': float(value[i]),
+                'valuePerUser': float(value[i] / exposed[i]),
+            }
+        return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Query a columnar feature flag event log')
+    parser.add_argument('directory', help='Event log directory')
+    commands = parser.add_subparsers(dest='command', required=True)
+    exposures = commands.add_parser('exposures', help='Exposures per variant of a flag')
+    exposures.add_argument('flag')
+    exposures.add_argument('--period', type=float, help='Seconds per datapoint')
+    ab = commands.add_parser('ab', help='Conversion of an outcome per variant of a flag')
+    ab.add_argument('flag')
+    ab.add_argument('outcome')
+    for command in (exposures, ab):
+        command.add_argument('--start', help='ISO 8601 start time (inclusive)')
+        command.add_argument('--end', help='ISO 8601 end time (exclusive)')
+    args = parser.parse_args()
+
+    log = EventLog(args.directory)
+    if args.command == 'exposures':
+        result = log.exposures(args.flag, args.start, args.end, args.period)
+    else:
+        result = log.ab_results(args.flag, args.outcome, args.start, args.end)
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
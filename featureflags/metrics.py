@@ -0,0 +1,206 @@
+"""Batched evaluation metrics in place of one sendMetric call per evaluation.
+
+Every thread counts evaluations in its own dict, so the hot path is one dict
+update with no lock and no I/O. A background thread periodically diffs those
+cumulative counters against what it already reported, builds the same metrics
+sendAggregatedMetrics publishes from backend/src/services/metrics.js, and hands
+PutMetricData payloads of at most MAX_DATUMS_PER_CALL datums to a sink.
+"""
+
+import datetime
+import json
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+NAMESPACE = 'FeatureFlags'
+MAX_DATUMS_PER_CALL = 1000
+DEFAULT_FLUSH_INTERVAL = 60.0
+
+
+class StubSink:
+    """Keeps payloads in memory; for local runs and simulations."""
+
+    def __init__(self):
+        self.payloads = []
+
+    def __call__(self, payload):
+        self.payloads.append(payload)
+
+    def datums(self):
+        return [datum for payload in self.payloads for datum in payload['MetricData']]
+
+
+class FileSink:
+    """Appends each payload to a file as one JSON line."""
+
+    def __init__(self, path):
+        self.path = path
+
+    def __call__(self, payload):
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(payload, default=_isoformat, ensure_ascii=False) + '\n')
+
+
+class CloudWatchSink:
+    """Sends payloads with boto3's put_metric_data."""
+
+    def __init__(self, client=None, region_name=None):
+        if client is None:
+            try:
+                import boto3
+            except ImportError:
+                raise ImportError('CloudWatchSink requires boto3. Please run: pip install boto3')
+            client = boto3.client('cloudwatch', region_name=region_name)
+        self.client = client
+
+    def __call__(self, payload):
+        self.client.put_metric_data(**payload)
+
+
+def _isoformat(value):
+    if isinstance(value, datetime.datetime):
+        return value.isoformat()
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+
+def _datum(name, value, unit, timestamp, **dimensions):
+    return {
+        'MetricName': name,
+        'Value': value,
+        'Unit': unit,
+        'Timestamp': timestamp,
+        'Dimensions': [{'Name': key, 'Value': str(value)} for key, value in dimensions.items()],
+    }
+
+
+class MetricsAggregator:
+    """Sharded per-thread evaluation counters merged and flushed in the background.
+
+    Shards only ever grow, and only their owning thread writes to them; flush()
+    copies each shard and reports the difference from the previous copy, so an
+    increment racing with a flush is counted in the next one instead of lost.
+    The shard of a thread that has exited is reported one last time and dropped.
+    """
+
+    def __init__(self, sink=None, flush_interval=DEFAULT_FLUSH_INTERVAL, namespace=NAMESPACE):
+        self.sink = StubSink() if sink is None else sink
+        self.flush_interval = flush_interval
+        self.namespace = namespace
+        self.calls = 0
+        self.datums = 0
+        self.failed_calls = 0
+        self._local = threading.local()
+        # (owning thread, counts, counts already reported) per recording thread
+        self._shards = []
+        self._shards_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _new_shard(self):
+        counts = self._local.counts = {}
+        with self._shards_lock:
+            self._shards.append((threading.current_thread(), counts, {}))
+        return counts
+
+    def record(self, flag_name, enabled, variant=None):
+        """Count one evaluation; called on the evaluation hot path."""
+        try:
+            counts = self._local.counts
+        except AttributeError:
+            counts = self._new_shard()
+        key = (flag_name, enabled, variant)
+        counts[key] = counts.get(key, 0) + 1
+
+    def collect(self):
+        """Merge every shard's counts since the last collect() into one dict."""
+        merged = {}
+        with self._shards_lock:
+            shards = list(self._shards)
+        finished = []
+        for entry in shards:
+            thread, shard, reported = entry
+            # Checked before the copy: a dead thread's shard is final, so this copy is its last delta
+            if not thread.is_alive():
+                finished.append(entry)
+            current = dict(shard)
+            for key, count in current.items():
+                delta = count - reported.get(key, 0)
+                if delta:
+                    merged[key] = merged.get(key, 0) + delta
+            reported.update(current)
+        if finished:
+            finished = {id(entry) for entry in finished}
+            with self._shards_lock:
+                self._shards = [entry for entry in self._shards if id(entry) not in finished]
+        return merged
+
+    def build_datums(self, counts, timestamp=None):
+        """The per-flag metrics of sendAggregatedMetrics plus VariantAssignment per variant."""
+        timestamp = timestamp or datetime.datetime.now(datetime.timezone.utc)
+        flags = {}
+        variants = {}
+        for (flag_name, enabled, variant), count in counts.items():
+            totals = flags.setdefault(flag_name, [0, 0])
+            totals[0 if enabled else 1] += count
+            if enabled and variant is not None:
+                variants[flag_name, variant] = variants.get((flag_name, variant), 0) + count
+
+        datums = []
+        for flag_name, (enabled, disabled) in flags.items():
+            total = enabled + disabled
+            datums.append(_datum('FeatureFlagEvaluations', total, 'Count', timestamp, FeatureFlagName=flag_name))
+            datums.append(_datum('FeatureFlagEnabled', enabled, 'Count', timestamp, FeatureFlagName=flag_name))
+            datums.append(_datum('FeatureFlagDisabled', disabled, 'Count', timestamp, FeatureFlagName=flag_name))
+            datums.append(_datum('FeatureFlagEnablementRate', enabled / total * 100, 'Percent', timestamp,
+                                 FeatureFlagName=flag_name))
+        for (flag_name, variant), count in variants.items():
+            datums.append(_datum('VariantAssignment', count, 'Count', timestamp,
+                                 FeatureFlagName=flag_name, Variant=variant))
+        return datums
+
+    def flush(self, timestamp=None):
+        """Send everything counted so far; returns the number of sink calls made."""
+        with self._flush_lock:
+            datums = self.build_datums(self.collect(), timestamp)
+            calls = 0
+            for start in range(0, len(datums), MAX_DATUMS_PER_CALL):
+                batch = datums[start:start + MAX_DATUMS_PER_CALL]
+                try:
+                    self.sink({'Namespace': self.namespace, 'MetricData': batch})
+                except Exception:
+                    # Like sendMetric: metrics failures are logged, never raised to callers
+                    self.failed_calls += 1
+                    logger.exception('Failed to send %d metric datums', len(batch))
+                    continue
+                calls += 1
+                self.datums += len(batch)
+            self.calls += calls
+            return calls
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+
+    def start(self):
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='featureflags-metrics', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop the flush thread and send whatever is still pending."""
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
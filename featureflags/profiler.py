@@ -0,0 +1,332 @@
+"""Opt-in latency profiling for flag evaluation and document generation.
+
+Nothing here runs unless a profiler is installed, and even then only sampled
+calls pay for timing: instrument() periodically shadows an evaluator's
+evaluate/is_enabled with one-shot timed versions on that instance only. Samples
+are split by phase (lookup, hash, targeting, variant) into log-linear histograms
+with ~3% relative error; sampled calls slower than slow_ns also keep their stack.
+"""
+
+import collections
+import json
+import sys
+import threading
+import time
+import traceback
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from .evaluator import string_hash
+
+SUB_BUCKET_BITS = 5
+DEFAULT_SAMPLE_INTERVAL = 0.001
+DEFAULT_SLOW_NS = 1_000_000
+QUANTILES = (0.5, 0.9, 0.99, 0.999)
+
+
+class LatencyHistogram:
+    """HDR-style histogram of nanosecond values: 2**SUB_BUCKET_BITS buckets per power of two."""
+
+    __slots__ = ('counts', 'count', 'total', 'min', 'max')
+
+    def __init__(self):
+        self.counts = {}
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = 0
+
+    @staticmethod
+    def bucket(value):
+        shift = value.bit_length() - SUB_BUCKET_BITS
+        if shift <= 0:
+            return value
+        return (shift << SUB_BUCKET_BITS) + (value >> shift)
+
+    @staticmethod
+    def bucket_range(index):
+        """Lowest and highest value that fall into bucket index."""
+        shift, mantissa = divmod(index, 1 << SUB_BUCKET_BITS)
+        if shift == 0:
+            return index, index
+        return mantissa << shift, ((mantissa + 1) << shift) - 1
+
+    def record(self, value):
+        index = self.bucket(value)
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.count += 1
+        self.total += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    def merge(self, other):
+        for index, count in other.counts.items():
+            self.counts[index] = self.counts.get(index, 0) + count
+        self.count += other.count
+        self.total += other.total
+        if other.min is not None and (self.min is None or other.min < self.min):
+            self.min = other.min
+        self.max = max(self.max, other.max)
+
+    def percentile(self, q):
+        if not self.count:
+            return 0
+        rank = q * self.count
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= rank:
+                low, high = self.bucket_range(index)
+                return min(max((low + high) // 2, self.min), self.max)
+        return self.max
+
+    def summary(self):
+        return {
+            'count': self.count,
+            'meanNs': self.total / self.count if self.count else 0,
+            'minNs': self.min or 0,
+            'maxNs': self.max,
+            **{f'p{q * 100:g}Ns': self.percentile(q) for q in QUANTILES},
+        }
+
+
+class Profiler:
+    """Latency histograms keyed by (component, name, phase) plus recent slow-call stacks.
+
+    A sampler thread arms every instrumented target once per sample_interval by
+    installing one-shot timed methods on the instance; the next call is timed and
+    removes its wrapper, so calls between samples run the original code untouched.
+    """
+
+    def __init__(self, sample_interval=DEFAULT_SAMPLE_INTERVAL, slow_ns=DEFAULT_SLOW_NS, max_stacks=100,
+                 count_allocations=True):
+        self.sample_interval = sample_interval
+        self.slow_ns = slow_ns
+        self.count_allocations = count_allocations
+        self.histograms = collections.defaultdict(LatencyHistogram)
+        self.allocations = collections.Counter()
+        self.slow_calls = collections.deque(maxlen=max_stacks)
+        self.calls = collections.Counter()
+        self._lock = threading.Lock()
+        self._targets = {}
+        self._stop = threading.Event()
+        self._thread = None
+
+    def observe(self, component, name, phase, nanoseconds):
+        self.histograms[component, name, phase].record(nanoseconds)
+
+    def _slow_call(self, component, name, nanoseconds, frame):
+        self.slow_calls.append({
+            'component': component,
+            'name': name,
+            'latencyNs': nanoseconds,
+            'timestamp': time.time(),
+            'stack': traceback.format_stack(frame, limit=20),
+        })
+
+    def _register(self, target, arm):
+        with self._lock:
+            self._targets[id(target)] = arm
+            if self._thread is None:
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name='featureflags-profiler', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.sample_interval):
+            with self._lock:
+                arms = list(self._targets.values())
+            for arm in arms:
+                arm()
+
+    def stop(self):
+        """Stop sampling; collected histograms stay available for export."""
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+
+    def uninstrument(self, target):
+        with self._lock:
+            self._targets.pop(id(target), None)
+        for name in ('evaluate', 'is_enabled'):
+            target.__dict__.pop(name, None)
+        handlers = target.__dict__.pop('_unprofiled_handlers', None)
+        if handlers is not None:
+            target._handlers.update(handlers)
+        return target
+
+    def instrument(self, evaluator):
+        """Sample evaluator.evaluate/is_enabled phase by phase; returns the evaluator."""
+        profiler = self
+        clock = time.perf_counter_ns
+        blocks = sys.getallocatedblocks
+        resolve = evaluator._resolve
+
+        def evaluate(flag_name, user_id, user_groups=(), user_attributes=None, user_hash=None):
+            evaluator.__dict__.pop('evaluate', None)
+            allocated = blocks() if profiler.count_allocations else 0
+            t0 = clock()
+            flag = resolve(flag_name)
+            t1 = clock()
+            if flag is None:
+                return {'enabled': False, 'variant': None}
+            if user_hash is None:
+                user_hash = string_hash(str(user_id))
+            t2 = clock()
+            enabled = flag.is_enabled(user_id, user_groups, user_hash)
+            t3 = clock()
+            variant = flag.choose_variant(user_id, user_hash) if enabled else None
+            t4 = clock()
+            if profiler.count_allocations:
+                profiler.allocations['evaluate', flag_name] += blocks() - allocated
+
+            profiler._record_evaluation(flag_name, t0, t1, t2, t3, t4, enabled)
+            if t4 - t0 >= profiler.slow_ns:
+                profiler._slow_call('evaluate', flag_name, t4 - t0, sys._getframe(1))
+            if evaluator.metrics is not None:
+                evaluator.metrics.record(flag_name, enabled, variant)
+            return {'enabled': enabled, 'variant': variant}
+
+        def is_enabled(flag_name, user_id, user_groups=(), user_attributes=None):
+            evaluator.__dict__.pop('is_enabled', None)
+            t0 = clock()
+            flag = resolve(flag_name)
+            t1 = clock()
+            if flag is None:
+                return False
+            enabled = flag.is_enabled(user_id, user_groups)
+            t3 = clock()
+
+            profiler._record_evaluation(flag_name, t0, t1, t1, t3, t3, enabled)
+            if t3 - t0 >= profiler.slow_ns:
+                profiler._slow_call('evaluate', flag_name, t3 - t0, sys._getframe(1))
+            if evaluator.metrics is not None:
+                evaluator.metrics.record(flag_name, enabled)
+            return enabled
+
+        def arm():
+            evaluator.evaluate = evaluate
+            evaluator.is_enabled = is_enabled
+
+        self._register(evaluator, arm)
+        return evaluator
+
+    def _record_evaluation(self, flag_name, t0, t1, t2, t3, t4, enabled):
+        with self._lock:
+            self.calls['evaluate', flag_name] += 1
+            self.observe('evaluate', flag_name, 'lookup', t1 - t0)
+            self.observe('evaluate', flag_name, 'hash', t2 - t1)
+            self.observe('evaluate', flag_name, 'targeting', t3 - t2)
+            if enabled:
+                self.observe('evaluate', flag_name, 'variant', t4 - t3)
+            self.observe('evaluate', flag_name, 'total', t4 - t0)
+
+    def instrument_writer(self, writer):
+        """Sample the block handlers of a BlockWriter as (docgen, block type, 'emit')."""
+        profiler = self
+        clock = time.perf_counter_ns
+        handlers = writer._unprofiled_handlers = dict(writer._handlers)
+
+        def one_shot(kind, handler):
+            def write(block):
+                writer._handlers[kind] = handler
+                start = clock()
+                handler(block)
+                elapsed = clock() - start
+                with profiler._lock:
+                    profiler.calls['docgen', kind] += 1
+                    profiler.observe('docgen', kind, 'emit', elapsed)
+                if elapsed >= profiler.slow_ns:
+                    profiler._slow_call('docgen', kind, elapsed, sys._getframe(1))
+            return write
+
+        def arm():
+            for kind, handler in handlers.items():
+                writer._handlers[kind] = one_shot(kind, handler)
+
+        self._register(writer, arm)
+        return writer
+
+    def report(self):
+        """JSON-ready view: one entry per (component, name) with a summary per phase."""
+        entries = {}
+        with self._lock:
+            items = sorted(self.histograms.items())
+            for (component, name, phase), histogram in items:
+                entry = entries.setdefault((component, name), {
+                    'component': component,
+                    'name': name,
+                    'sampledCalls': self.calls[component, name],
+                    'phases': {},
+                })
+                entry['phases'][phase] = histogram.summary()
+            for (component, name), blocks in self.allocations.items():
+                entry = entries.get((component, name))
+                if entry and entry['sampledCalls']:
+                    entry['allocatedBlocksPerCall'] = blocks / entry['sampledCalls']
+        return {
+            'sampleIntervalSeconds': self.sample_interval,
+            'slowNs': self.slow_ns,
+            'entries': list(entries.values()),
+            'slowCalls': list(self.slow_calls),
+        }
+
+    def prometheus_text(self):
+        """Prometheus exposition format: one summary per component, labelled by name and phase."""
+        lines = []
+        with self._lock:
+            items = sorted(self.histograms.items())
+        for component in sorted({key[0] for key, _ in items}):
+            metric = f'featureflags_{component}_latency_seconds'
+            lines.append(f'# HELP {metric} Sampled {component} latency by phase.')
+            lines.append(f'# TYPE {metric} summary')
+            for (c, name, phase), histogram in items:
+                if c != component:
+                    continue
+                labels = f'name="{_label(name)}",phase="{phase}"'
+                for q in QUANTILES:
+                    lines.append(f'{metric}{{{labels},quantile="{q}"}} {histogram.percentile(q) / 1e9:.9f}')
+                lines.append(f'{metric}_sum{{{labels}}} {histogram.total / 1e9:.9f}')
+                lines.append(f'{metric}_count{{{labels}}} {histogram.count}')
+        return '\n'.join(lines) + '\n'
+
+    def write(self, path):
+        """Write the report as Prometheus text for *.prom/*.txt paths, JSON otherwise."""
+        with open(path, 'w', encoding='utf-8') as f:
+            if path.endswith(('.prom', '.txt')):
+                f.write(self.prometheus_text())
+            else:
+                json.dump(self.report(), f, ensure_ascii=False, indent=2)
+
+    def serve(self, port=9464, host='127.0.0.1'):
+        """Expose /metrics (Prometheus) and /profile.json from a background thread."""
+        profiler = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == '/metrics':
+                    body, content_type = profiler.prometheus_text(), 'text/plain; version=0.0.4'
+                elif self.path == '/profile.json':
+                    body, content_type = json.dumps(profiler.report(), ensure_ascii=False), 'application/json'
+                else:
+                    self.send_error(404)
+                    return
+                data = body.encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=server.serve_forever, name='featureflags-profiler-http', daemon=True).start()
+        return server
+
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
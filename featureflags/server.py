@@ -0,0 +1,429 @@
+"""Asyncio evaluation service speaking the backend's evaluate/batch-evaluate schema.
+
+Two listeners share one EvaluationService:
+
+* HTTP/1.1 with keep-alive: POST /api/feature-flags/:flagName/evaluate and
+  POST /api/feature-flags/batch-evaluate, bodies and responses as in
+  backend/src/routes/featureFlags.js.
+  With a ChangeLog, GET /api/feature-flags/changes?since=&epoch= serves its
+  deltas to ChangeSubscriber clients. With an EventLog, every evaluation is
+  logged as an exposure and GET /api/feature-flags/:flagName/metrics is
+  answered from it.
+* Newline-delimited JSON: each line is {"id", "flagName" | "flagNames",
+  "userId", "userGroups", "userAttributes"} and is answered, in order, with
+  {"id", "status", "body"} where body is the HTTP response body. Clients may
+  pipeline any number of frames without waiting for replies.
+
+Requests for the same user that arrive in the same event-loop iteration share
+one evaluate_many pass, and per-user results are kept in an LRU keyed by the
+flag set's (version, lastUpdated), so a new flag version never serves stale data.
+"""
+
+import argparse
+import asyncio
+import collections
+import datetime
+import json
+import logging
+import urllib.parse
+
+from .evaluator import DEFAULT_FLAGS_FILE, FlagEvaluator
+
+logger = logging.getLogger(__name__)
+
+API_PREFIX = '/api/feature-flags/'
+DEFAULT_CACHE_SIZE = 100_000
+REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 500: 'Internal Server Error'}
+
+
+def _timestamp():
+    """new Date().toISOString()"""
+    now = datetime.datetime.now(datetime.timezone.utc)
+    return now.isoformat(timespec='milliseconds').replace('+00:00', 'Z')
+
+
+def _invalid(message):
+    return 400, {'success': False, 'error': 'Invalid request data', 'message': message}
+
+
+def validate_user_context(body):
+    """userContextSchema from the routes file; returns (context, error message)."""
+    if not isinstance(body, dict):
+        return None, '"value" must be of type object'
+    for key in body:
+        if key not in ('userId', 'userGroups', 'userAttributes'):
+            return None, f'"{key}" is not allowed'
+    user_id = body.get('userId')
+    if user_id is None:
+        return None, '"userId" is required'
+    if not isinstance(user_id, str):
+        return None, '"userId" must be a string'
+    if not user_id:
+        return None, '"userId" is not allowed to be empty'
+    user_groups = body.get('userGroups', [])
+    if not isinstance(user_groups, list):
+        return None, '"userGroups" must be an array'
+    for i, group in enumerate(user_groups):
+        if not isinstance(group, str):
+            return None, f'"userGroups[{i}]" must be a string'
+    user_attributes = body.get('userAttributes', {})
+    if not isinstance(user_attributes, dict):
+        return None, '"userAttributes" must be of type object'
+    return (user_id, user_groups, user_attributes), None
+
+
+class LRUCache:
+    def __init__(self, max_entries=DEFAULT_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def peek(self, key):
+        return self._entries.get(key)
+
+    def put(self, key, value):
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+
+class EvaluationService:
+    """Coalescing, caching front end for a FlagEvaluator or a SnapshotReader."""
+
+    def __init__(self, source, cache_size=DEFAULT_CACHE_SIZE, changelog=None, events=None):
+        # A SnapshotReader hands out the newest snapshot; a FlagEvaluator is fixed
+        self._current = getattr(source, 'current', lambda: source)
+        self.changelog = changelog
+        self.events = events
+        self.cache = LRUCache(cache_size)
+        self.coalesced = 0
+        self._pending = {}
+
+    async def results(self, user_id, flag_names, user_groups=()):
+        """{'enabled', 'variant'} per flag name, as in the batch-evaluate `results` object."""
+        evaluator = self._current()
+        key = (evaluator.version, evaluator.last_updated, user_id, frozenset(user_groups))
+        entry = self.cache.get(key)
+        if entry is not None and all(name in entry for name in flag_names):
+            return self._exposed(user_id, {name: entry[name] for name in flag_names})
+
+        pending = self._pending.get(key)
+        if pending is None:
+            pending = self._pending[key] = (asyncio.get_running_loop().create_future(), set())
+            asyncio.get_running_loop().call_soon(self._evaluate_pending, key, evaluator)
+        else:
+            self.coalesced += 1
+        pending[1].update(flag_names)
+        entry = await pending[0]
+        return self._exposed(user_id, {name: entry[name] for name in flag_names})
+
+    def _exposed(self, user_id, results):
+        # Cached answers are exposures too, so log per request rather than per evaluation
+        if self.events is not None:
+            self.events.record_results(user_id, results)
+        return results
+
+    def _evaluate_pending(self, key, evaluator):
+        future, flag_names = self._pending.pop(key)
+        _, _, user_id, user_groups = key
+        entry = self.cache.peek(key) or {}
+        missing = [name for name in flag_names if name not in entry]
+        try:
+            entry.update(evaluator.evaluate_many(missing, user_id, user_groups))
+        except Exception as e:
+            future.set_exception(e)
+            return
+        self.cache.put(key, entry)
+        future.set_result(entry)
+
+    async def evaluate(self, flag_name, body):
+        """POST /:flagName/evaluate"""
+        context, error = validate_user_context(body)
+        if error:
+            return _invalid(error)
+        user_id, user_groups, _ = context
+        result = (await self.results(user_id, (flag_name,), user_groups))[flag_name]
+        return 200, {
+            'success': True,
+            'data': {
+                'flagName': flag_name,
+                'userId': user_id,
+                'enabled': result['enabled'],
+                'variant': result['variant'],
+                'timestamp': _timestamp(),
+            },
+        }
+
+    async def batch_evaluate(self, body):
+        """POST /batch-evaluate"""
+        if not isinstance(body, dict):
+            body = {}
+        flag_names = body.get('flagNames')
+        user_id = body.get('userId')
+        if not flag_names or not isinstance(flag_names, list) or not user_id:
+            return _invalid('flagNames (array) and userId are required')
+        for i, flag_name in enumerate(flag_names):
+            if not isinstance(flag_name, str):
+                return _invalid(f'"flagNames[{i}]" must be a string')
+        if not isinstance(user_id, str):
+            return _invalid('"userId" must be a string')
+        user_groups = body.get('userGroups') or []
+        if not isinstance(user_groups, list):
+            return _invalid('"userGroups" must be an array')
+        for i, group in enumerate(user_groups):
+            if not isinstance(group, str):
+                return _invalid(f'"userGroups[{i}]" must be a string')
+        return 200, {
+            'success': True,
+            'data': {
+                'userId': user_id,
+                'results': await self.results(user_id, flag_names, user_groups),
+                'timestamp': _timestamp(),
+            },
+        }
+
+    def changes(self, query):
+        """GET /changes?since=<seq>&epoch=<epoch>"""
+        if self.changelog is None:
+            return 404, {'error': 'Route not found'}
+        params = urllib.parse.parse_qs(query)
+        try:
+            since = int(params.get('since', ['0'])[0])
+        except ValueError:
+            return _invalid('"since" must be a number')
+        epoch = params.get('epoch', [None])[0]
+        return 200, {'success': True, 'data': self.changelog.changes_since(since, epoch)}
+
+    async def metrics(self, flag_name, query):
+        """GET /:flagName/metrics?startTime=&endTime=&period=300"""
+        if self.events is None:
+            return 404, {'error': 'Route not found'}
+        params = urllib.parse.parse_qs(query)
+        start_time = params.get('startTime', [None])[0]
+        end_time = params.get('endTime', [None])[0]
+        if not start_time or not end_time:
+            return 400, {
+                'success': False,
+                'error': 'Invalid request parameters',
+                'message': 'startTime and endTime are required',
+            }
+        try:
+            period = int(params.get('period', ['300'])[0])
+            # Segment scans and the EventLog lock would stall every connection on the loop
+            exposures = await asyncio.to_thread(self.events.exposures, flag_name, start_time, end_time, period)
+        except ValueError as e:
+            return 400, {'success': False, 'error': 'Invalid request parameters', 'message': str(e)}
+        return 200, {
+            'success': True,
+            'data': {
+                'flagName': flag_name,
+                'metrics': exposures['datapoints'],
+                'period': period,
+                'startTime': start_time,
+                'endTime': end_time,
+            },
+        }
+
+    async def handle(self, method, path, body, query=''):
+        """Route one request; returns (status, JSON-ready body)."""
+        try:
+            if path == '/api/health' and method == 'GET':
+                evaluator = self._current()
+                return 200, {
+                    'status': 'healthy',
+                    'timestamp': _timestamp(),
+                    'flags': {'version': evaluator.version, 'lastUpdated': evaluator.last_updated},
+                    'cache': {'entries': len(self.cache), 'hits': self.cache.hits,
+                              'misses': self.cache.misses, 'coalesced': self.coalesced},
+                }
+            if method == 'GET' and path == API_PREFIX + 'changes':
+                return self.changes(query)
+            if method == 'GET' and path.startswith(API_PREFIX) and path.endswith('/metrics'):
+                flag_name = path[len(API_PREFIX):-len('/metrics')]
+                if flag_name and '/' not in flag_name:
+                    return await self.metrics(urllib.parse.unquote(flag_name), query)
+            if method == 'POST' and path.startswith(API_PREFIX):
+                rest = path[len(API_PREFIX):]
+                if rest == 'batch-evaluate':
+                    return await self.batch_evaluate(body)
+                flag_name, _, action = rest.rpartition('/')
+                if action == 'evaluate' and flag_name and '/' not in flag_name:
+                    return await self.evaluate(urllib.parse.unquote(flag_name), body)
+            return 404, {'error': 'Route not found'}
+        except Exception as e:
+            logger.exception('Error evaluating feature flags')
+            return 500, {'success': False, 'error': 'Failed to evaluate feature flags', 'message': str(e)}
+
+    async def handle_frame(self, line):
+        """Answer one NDJSON frame."""
+        try:
+            frame = json.loads(line)
+        except ValueError:
+            return {'id': None, 'status': 400, 'body': _invalid('Frame is not valid JSON')[1]}
+        if not isinstance(frame, dict):
+            return {'id': None, 'status': 400, 'body': _invalid('"value" must be of type object')[1]}
+        frame_id = frame.pop('id', None)
+        try:
+            if 'flagNames' in frame:
+                status, body = await self.batch_evaluate(frame)
+            elif isinstance(frame.get('flagName'), str):
+                status, body = await self.evaluate(frame.pop('flagName'), frame)
+            else:
+                status, body = _invalid('flagName or flagNames is required')
+        except Exception as e:
+            # Answer the failing frame alone; the connection and later pipelined frames carry on
+            logger.exception('Error evaluating feature flags')
+            status, body = 500, {'success': False, 'error': 'Failed to evaluate feature flags', 'message': str(e)}
+        return {'id': frame_id, 'status': status, 'body': body}
+
+
+class EvaluationServer:
+    """Keep-alive HTTP/1.1 and pipelined NDJSON listeners for an EvaluationService."""
+
+    def __init__(self, service, host='127.0.0.1', port=3100, ndjson_port=3101):
+        self.service = service
+        self.host = host
+        self.port = port
+        self.ndjson_port = ndjson_port
+        self.servers = []
+
+    async def _handle_http(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                try:
+                    method, target, version = request_line.decode('latin-1').split()
+                except ValueError:
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                length = int(headers.get('content-length') or 0)
+                raw = await reader.readexactly(length) if length else b''
+
+                try:
+                    body = json.loads(raw) if raw else {}
+                except ValueError:
+                    status, payload = _invalid('Request body is not valid JSON')
+                else:
+                    path, _, query = target.partition('?')
+                    status, payload = await self.service.handle(method, path, body, query)
+
+                connection = headers.get('connection', '').lower()
+                keep_alive = connection == 'keep-alive' or (version == 'HTTP/1.1' and connection != 'close')
+                data = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+                writer.write(
+                    f'HTTP/1.1 {status} {REASONS.get(status, "")}\r\n'
+                    f'Content-Type: application/json; charset=utf-8\r\n'
+                    f'Content-Length: {len(data)}\r\n'
+                    f'Connection: {"keep-alive" if keep_alive else "close"}\r\n\r\n'.encode('latin-1') + data
+                )
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _handle_ndjson(self, reader, writer):
+        buffer = b''
+        try:
+            while True:
+                chunk = await reader.read(65536)
+                if not chunk:
+                    break
+                buffer += chunk
+                *lines, buffer = buffer.split(b'\n')
+                lines = [line for line in lines if line.strip()]
+                if not lines:
+                    continue
+                # Frames read together are answered together, so same-user frames coalesce
+                replies = await asyncio.gather(*(self.service.handle_frame(line) for line in lines))
+                writer.write(b''.join(
+                    json.dumps(reply, ensure_ascii=False).encode('utf-8') + b'\n' for reply in replies
+                ))
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def start(self):
+        self.servers.append(await asyncio.start_server(self._handle_http, self.host, self.port))
+        if self.ndjson_port is not None:
+            self.servers.append(await asyncio.start_server(self._handle_ndjson, self.host, self.ndjson_port))
+        for server in self.servers:
+            for sock in server.sockets:
+                logger.info('Listening on %s', sock.getsockname())
+        return self
+
+    async def serve_forever(self):
+        await self.start()
+        await asyncio.gather(*(server.serve_forever() for server in self.servers))
+
+    def close(self):
+        for server in self.servers:
+            server.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve flag evaluations over HTTP and pipelined NDJSON')
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument('--flags', default=DEFAULT_FLAGS_FILE, help='feature-flags.json to evaluate')
+    source.add_argument('--snapshot', help='Snapshot file published by featureflags.snapshot')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=3100, help='HTTP port')
+    parser.add_argument('--ndjson-port', type=int, default=3101, help='NDJSON port (0 = pick a free port)')
+    parser.add_argument('--cache-size', type=int, default=DEFAULT_CACHE_SIZE, help='Users kept in the response cache')
+    parser.add_argument('--changelog', help='ChangeLog directory to serve at GET /api/feature-flags/changes')
+    parser.add_argument('--events', help='EventLog directory to log exposures to and serve metrics from')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+    if args.snapshot:
+        from .snapshot import SnapshotReader
+        flags = SnapshotReader(args.snapshot)
+    else:
+        flags = FlagEvaluator.from_file(args.flags)
+    changelog = None
+    if args.changelog:
+        from .changelog import ChangeLog
+        changelog = ChangeLog(args.changelog)
+    events = None
+    if args.events:
+        from .events import EventLog
+        events = EventLog(args.events).start()
+    service = EvaluationService(flags, args.cache_size, changelog, events)
+    server = EvaluationServer(service, args.host, args.port, args.ndjson_port)
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if events is not None:
+            events.stop()
+
+
+if __name__ == '__main__':
+    main()
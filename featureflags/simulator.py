@@ -0,0 +1,999 @@
+"""Offline rollout simulator and load generator for the automated rollback path.
+
+Synthetic users are replayed at a fixed QPS through FlagEvaluator on a set of
+simulated app nodes. The nodes talk to local, boto3-shaped stand-ins for
+AppConfig, CloudWatch and SNS. The alarms come from
+aws-config/setup-cloudwatch.sh, and alarm notifications go to a port of
+aws-config/lambda/rollback-function.js. As a result,
+error spike -> alarm -> rollback deployment -> nodes serving the flag off
+runs end to end on one machine.
+
+Everything except the evaluation work runs on a virtual clock, so 5-minute
+alarm periods and 6-minute deployment steps take seconds. Evaluation is timed
+for real, which gives the throughput and headroom figures for capacity
+planning.
+"""
+
+import argparse
+import collections
+import datetime
+import heapq
+import json
+import logging
+import os
+import random
+import re
+import shlex
+import time
+
+from .changeset import generate_version
+from .evaluator import DEFAULT_FLAGS_FILE, FlagEvaluator, load_flags, string_hash
+from .metrics import MAX_DATUMS_PER_CALL, NAMESPACE, MetricsAggregator, _datum
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ALARM_SCRIPT = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    'aws-config', 'setup-cloudwatch.sh',
+)
+TOPIC_ARN = 'arn:aws:sns:us-east-1:000000000000:feature-flag-alerts'
+ALARM_NAME_PATTERN = re.compile(r'^FeatureFlag-(.+)-ErrorRate$')
+ROLLBACK_REASON = 'Automated rollback due to alarm'
+ALARM_EVALUATION_INTERVAL = 60.0
+
+# DeploymentStrategyId -> (deployment minutes, growth percent, final bake minutes)
+DEPLOYMENT_STRATEGIES = {
+    'AppConfig.AllAtOnce': (0, 100, 10),
+    'AppConfig.Linear50PercentEvery30Seconds': (1, 50, 1),
+    'AppConfig.Linear20PercentEvery6Minutes': (30, 20, 30),
+}
+
+COMPARISONS = {
+    'GreaterThanThreshold': lambda value, threshold: value > threshold,
+    'GreaterThanOrEqualToThreshold': lambda value, threshold: value >= threshold,
+    'LessThanThreshold': lambda value, threshold: value < threshold,
+    'LessThanOrEqualToThreshold': lambda value, threshold: value <= threshold,
+}
+
+STATISTICS = {
+    'Average': lambda values: sum(values) / len(values),
+    'Sum': sum,
+    'Minimum': min,
+    'Maximum': max,
+    'SampleCount': len,
+}
+
+Spike = collections.namedtuple('Spike', 'flag start end rate')
+Ramp = collections.namedtuple('Ramp', 'flag start step every')
+
+
+class ConflictException(RuntimeError):
+    """AppConfig's answer to a second deployment or a stale LatestVersionNumber."""
+
+
+def _iso(moment):
+    """Date.prototype.toISOString() of an aware datetime."""
+    return moment.isoformat(timespec='milliseconds').replace('+00:00', 'Z')
+
+
+class VirtualClock:
+    """Seconds since start; datetime() maps them onto wall-clock time for timestamps."""
+
+    def __init__(self, start=None):
+        if start is None:
+            start = datetime.datetime.now(datetime.timezone.utc).replace(minute=0, second=0, microsecond=0)
+        self.start = start
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def datetime(self, seconds=None):
+        return self.start + datetime.timedelta(seconds=self.now if seconds is None else seconds)
+
+    def seconds(self, moment):
+        return (moment - self.start).total_seconds()
+
+
+class LocalAppConfig:
+    """Hosted configuration versions and deployments of one configuration profile.
+
+    Like AppConfig, an environment runs one deployment at a time, counting the
+    final bake, and a LatestVersionNumber that is not the latest version is
+    rejected. Each client gets the newest deployment whose rollout covers its
+    bucket, a stable hash of the ClientId.
+    """
+
+    def __init__(self, document, clock, strategies=DEPLOYMENT_STRATEGIES):
+        self.clock = clock
+        self.strategies = strategies
+        self.versions = [json.dumps(document).encode('utf-8')]
+        self.deployments = []
+
+    @property
+    def latest_version(self):
+        return len(self.versions)
+
+    def create_hosted_configuration_version(self, Content, LatestVersionNumber=None, Description='', **ignored):
+        if LatestVersionNumber is not None and LatestVersionNumber != self.latest_version:
+            raise ConflictException(f'LatestVersionNumber {LatestVersionNumber} does not match the latest '
+                                    f'version {self.latest_version}')
+        self.versions.append(Content.encode('utf-8') if isinstance(Content, str) else Content)
+        logger.info('[%7.1fs] AppConfig: created hosted version %d (%s)',
+                    self.clock(), self.latest_version, Description)
+        return {'VersionNumber': self.latest_version}
+
+    def get_hosted_configuration_version(self, VersionNumber, **ignored):
+        return {'VersionNumber': VersionNumber, 'Content': self.versions[int(VersionNumber) - 1]}
+
+    def deployment_state(self, deployment, now=None):
+        elapsed = (self.clock() if now is None else now) - deployment['StartedAt']
+        duration, _, bake = self.strategies[deployment['DeploymentStrategyId']]
+        if elapsed < duration * 60:
+            return 'DEPLOYING'
+        if elapsed < (duration + bake) * 60:
+            return 'BAKING'
+        return 'COMPLETE'
+
+    def deployed_percentage(self, deployment, now=None):
+        elapsed = (self.clock() if now is None else now) - deployment['StartedAt']
+        duration, growth, _ = self.strategies[deployment['DeploymentStrategyId']]
+        if elapsed >= duration * 60:
+            return 100
+        return min(100, growth * (1 + int(elapsed // (duration * 60 * growth / 100))))
+
+    def start_deployment(self, ConfigurationVersion, DeploymentStrategyId, Description='', **ignored):
+        if DeploymentStrategyId not in self.strategies:
+            raise ValueError(f'Unknown deployment strategy {DeploymentStrategyId!r}')
+        for deployment in self.deployments:
+            if self.deployment_state(deployment) != 'COMPLETE':
+                raise ConflictException(f'Deployment {deployment["DeploymentNumber"]} is already in progress')
+        deployment = {
+            'DeploymentNumber': len(self.deployments) + 1,
+            'ConfigurationVersion': str(ConfigurationVersion),
+            'DeploymentStrategyId': DeploymentStrategyId,
+            'Description': Description,
+            'StartedAt': self.clock(),
+        }
+        self.deployments.append(deployment)
+        logger.info('[%7.1fs] AppConfig: deployment %d of version %s with %s (%s)', self.clock(),
+                    deployment['DeploymentNumber'], ConfigurationVersion, DeploymentStrategyId, Description)
+        return {'DeploymentNumber': deployment['DeploymentNumber'], 'State': self.deployment_state(deployment)}
+
+    def get_configuration(self, ClientId, **ignored):
+        bucket = string_hash(ClientId) % 100
+        version = '1'
+        for deployment in reversed(self.deployments):
+            if bucket < self.deployed_percentage(deployment):
+                version = deployment['ConfigurationVersion']
+                break
+        return {'ConfigurationVersion': version, 'Content': self.versions[int(version) - 1]}
+
+
+class LocalSNS:
+    """Topics that deliver Lambda-style events to in-process subscribers."""
+
+    def __init__(self):
+        self.subscribers = collections.defaultdict(list)
+        self.messages = []
+
+    def subscribe(self, TopicArn, handler):
+        self.subscribers[TopicArn].append(handler)
+
+    def publish(self, TopicArn, Message, Subject=None, **ignored):
+        self.messages.append({'TopicArn': TopicArn, 'Subject': Subject, 'Message': Message})
+        event = {'Records': [{'Sns': {'TopicArn': TopicArn, 'Subject': Subject, 'Message': Message}}]}
+        for handler in self.subscribers[TopicArn]:
+            handler(event)
+        return {'MessageId': str(len(self.messages))}
+
+
+class _MetricAlarm:
+    def __init__(self, name, namespace, metric_name, dimensions, statistic, period, threshold, comparison,
+                 evaluation_periods, actions):
+        self.name = name
+        self.key = (namespace, metric_name, dimensions)
+        self.statistic = statistic
+        self.period = period
+        self.threshold = threshold
+        self.comparison = comparison
+        self.evaluation_periods = evaluation_periods
+        self.actions = actions
+        self.state = 'INSUFFICIENT_DATA'
+        self.transitions = []
+
+
+class _CompositeAlarm:
+    def __init__(self, name, rule, actions):
+        self.name = name
+        self.rule = rule
+        self.actions = actions
+        self.state = 'INSUFFICIENT_DATA'
+        self.transitions = []
+
+
+_RULE_TOKEN = re.compile(r'\s*(?:(ALARM|OK|INSUFFICIENT_DATA)\(\s*"?([^")]+?)"?\s*\)|(\(|\)|AND|OR|NOT|TRUE|FALSE))')
+
+
+def _parse_rule(rule):
+    """Compile a composite AlarmRule into a function of {alarm name: state}."""
+    tokens = []
+    position = 0
+    while position < len(rule.rstrip()):
+        match = _RULE_TOKEN.match(rule, position)
+        if match is None:
+            raise ValueError(f'Cannot parse alarm rule at {rule[position:]!r}')
+        tokens.append(match.groups())
+        position = match.end()
+    tokens.append((None, None, None))
+    index = 0
+
+    def factor():
+        nonlocal index
+        state, name, word = tokens[index]
+        index += 1
+        if state:
+            return lambda states: states.get(name) == state
+        if word == 'NOT':
+            inner = factor()
+            return lambda states: not inner(states)
+        if word in ('TRUE', 'FALSE'):
+            return lambda states: word == 'TRUE'
+        if word == '(':
+            inner = expression()
+            if tokens[index][2] != ')':
+                raise ValueError(f'Unbalanced parentheses in alarm rule {rule!r}')
+            index += 1
+            return inner
+        raise ValueError(f'Unexpected {word!r} in alarm rule {rule!r}')
+
+    def chain(operand, operator, combine):
+        def parse():
+            nonlocal index
+            parts = [operand()]
+            while tokens[index][2] == operator:
+                index += 1
+                parts.append(operand())
+            return parts[0] if len(parts) == 1 else lambda states: combine(part(states) for part in parts)
+        return parse
+
+    conjunction = chain(factor, 'AND', all)
+    expression = chain(conjunction, 'OR', any)
+    compiled = expression()
+    if tokens[index] != (None, None, None):
+        raise ValueError(f'Trailing tokens in alarm rule {rule!r}')
+    return compiled
+
+
+class LocalCloudWatch:
+    """PutMetricData storage plus metric and composite alarms on the virtual clock.
+
+    It can be called as a MetricsAggregator sink or passed to CloudWatchSink as
+    the client. Each PutMetricData call is queued behind the previous ones
+    (at most max_tps per second) and becomes visible to alarms put_latency
+    seconds after it starts. The difference between that moment and the call
+    is the ingestion lag the report shows.
+    """
+
+    def __init__(self, clock, sns=None, put_latency=0.0, max_tps=None):
+        self.clock = clock
+        self.sns = sns
+        self.put_latency = put_latency
+        self.max_tps = max_tps
+        self.datapoints = collections.defaultdict(list)
+        self.alarms = {}
+        self.calls = 0
+        self.datums = 0
+        self.max_lag = 0.0
+        self._busy_until = 0.0
+
+    def put_metric_data(self, Namespace, MetricData, **ignored):
+        now = self.clock()
+        start = max(now, self._busy_until)
+        if self.max_tps:
+            self._busy_until = start + 1 / self.max_tps
+        visible_at = start + self.put_latency
+        self.max_lag = max(self.max_lag, visible_at - now)
+        for datum in MetricData:
+            dimensions = tuple(sorted((d['Name'], d['Value']) for d in datum.get('Dimensions') or ()))
+            timestamp = datum.get('Timestamp')
+            at = now if timestamp is None else self.clock.seconds(timestamp)
+            self.datapoints[Namespace, datum['MetricName'], dimensions].append((at, datum['Value'], visible_at))
+        self.calls += 1
+        self.datums += len(MetricData)
+        return {}
+
+    def __call__(self, payload):
+        self.put_metric_data(**payload)
+
+    def put_metric_alarm(self, AlarmName, MetricName, Namespace, Statistic, Period, Threshold, ComparisonOperator,
+                         EvaluationPeriods, Dimensions=(), AlarmActions=(), **ignored):
+        dimensions = tuple(sorted((d['Name'], d['Value']) for d in Dimensions))
+        self.alarms[AlarmName] = _MetricAlarm(AlarmName, Namespace, MetricName, dimensions, Statistic, int(Period),
+                                              float(Threshold), ComparisonOperator, int(EvaluationPeriods),
+                                              list(AlarmActions))
+        return {}
+
+    def put_composite_alarm(self, AlarmName, AlarmRule, AlarmActions=(), **ignored):
+        self.alarms[AlarmName] = _CompositeAlarm(AlarmName, _parse_rule(AlarmRule), list(AlarmActions))
+        return {}
+
+    def _period_values(self, alarm, now):
+        # Aligned periods ending at the last boundary, oldest first, built from visible datapoints only
+        end = now // alarm.period * alarm.period
+        first = end - alarm.evaluation_periods * alarm.period
+        buckets = [[] for _ in range(alarm.evaluation_periods)]
+        for at, value, visible_at in self.datapoints.get(alarm.key, ()):
+            if first <= at < end and visible_at <= now:
+                buckets[int((at - first) // alarm.period)].append(value)
+        return [STATISTICS[alarm.statistic](values) if values else None for values in buckets]
+
+    def evaluate_alarms(self):
+        """Move alarms to their current state; returns the transitions made."""
+        now = self.clock()
+        transitions = []
+        for alarm in self.alarms.values():
+            if isinstance(alarm, _CompositeAlarm):
+                continue
+            values = self._period_values(alarm, now)
+            breaching = [v is not None and COMPARISONS[alarm.comparison](v, alarm.threshold) for v in values]
+            if all(breaching):
+                state = 'ALARM'
+                shown = ', '.join(f'{v:g}' for v in values)
+                reason = (f'Threshold Crossed: {len(values)} out of the last {len(values)} datapoints [{shown}] '
+                          f'were {alarm.comparison[:-len("Threshold")]} the threshold ({alarm.threshold:g}).')
+            elif all(v is None for v in values):
+                state, reason = 'INSUFFICIENT_DATA', 'Insufficient Data: no datapoints were received.'
+            else:
+                state, reason = 'OK', 'Threshold Crossed: not every datapoint breached the threshold.'
+            transitions.extend(self._transition(alarm, state, reason, now))
+
+        states = {name: alarm.state for name, alarm in self.alarms.items()}
+        for alarm in self.alarms.values():
+            if isinstance(alarm, _CompositeAlarm):
+                state = 'ALARM' if alarm.rule(states) else 'OK'
+                transitions.extend(self._transition(alarm, state, f'Alarm rule evaluated to {state}', now))
+        return transitions
+
+    def _transition(self, alarm, state, reason, now):
+        if state == alarm.state:
+            return []
+        old, alarm.state = alarm.state, state
+        alarm.transitions.append({'at': now, 'state': state, 'reason': reason})
+        logger.info('[%7.1fs] CloudWatch: %s %s -> %s', now, alarm.name, old, state)
+        if state == 'ALARM' and self.sns is not None:
+            message = json.dumps({
+                'AlarmName': alarm.name,
+                'OldStateValue': old,
+                'NewStateValue': state,
+                'NewStateReason': reason,
+                'StateChangeTime': _iso(self.clock.datetime(now)),
+            })
+            for topic in alarm.actions:
+                self.sns.publish(TopicArn=topic, Message=message, Subject=f'ALARM: "{alarm.name}"')
+        return [(alarm.name, state)]
+
+
+def load_alarm_script(path=DEFAULT_ALARM_SCRIPT, variables=None):
+    """The put-metric-alarm and put-composite-alarm calls of a setup script as (method, kwargs)."""
+    variables = {'SNS_TOPIC_ARN': TOPIC_ARN, **(variables or {})}
+    with open(path, 'r', encoding='utf-8') as f:
+        text = f.read().replace('\\\n', ' ')
+    calls = []
+    for line in text.splitlines():
+        if not line.strip().startswith(('aws cloudwatch put-metric-alarm', 'aws cloudwatch put-composite-alarm')):
+            continue
+        words = shlex.split(line)
+        kwargs = {}
+        i = 3
+        while i < len(words):
+            option = words[i][2:]
+            if i + 1 < len(words) and not words[i + 1].startswith('--'):
+                value = re.sub(r'\$\{?(\w+)\}?', lambda m: variables.get(m.group(1), m.group(0)), words[i + 1])
+                i += 2
+            else:
+                value = True
+                i += 1
+            kwargs[''.join(part.capitalize() for part in option.split('-'))] = value
+        kwargs.pop('Region', None)
+        if 'AlarmActions' in kwargs:
+            kwargs['AlarmActions'] = [kwargs['AlarmActions']]
+        if 'Dimensions' in kwargs:
+            kwargs['Dimensions'] = [dict(part.split('=', 1) for part in spec.split(','))
+                                    for spec in kwargs['Dimensions'].split()]
+        calls.append((words[2].replace('-', '_'), kwargs))
+    return calls
+
+
+def _response(status_code, body):
+    return {'statusCode': status_code, 'body': json.dumps(body)}
+
+
+def extract_feature_flag_name(alarm_name):
+    """extractFeatureFlagName(): FeatureFlag-{flagName}-ErrorRate -> flagName."""
+    match = ALARM_NAME_PATTERN.match(alarm_name)
+    return match.group(1) if match else None
+
+
+class RollbackFunction:
+    """Port of aws-config/lambda/rollback-function.js against boto3-shaped clients."""
+
+    def __init__(self, appconfig, cloudwatch, sns, clock, topic_arn=TOPIC_ARN):
+        self.appconfig = appconfig
+        self.cloudwatch = cloudwatch
+        self.sns = sns
+        self.clock = clock
+        self.topic_arn = topic_arn
+
+    def handler(self, event):
+        try:
+            message = json.loads(event['Records'][0]['Sns']['Message'])
+            alarm_name = message.get('AlarmName')
+            alarm_state = message.get('NewStateValue')
+            alarm_reason = message.get('NewStateReason')
+
+            flag_name = extract_feature_flag_name(alarm_name)
+            if not flag_name:
+                logger.error('Could not extract feature flag name from alarm: %s', alarm_name)
+                return _response(400, {'error': 'Invalid alarm name format'})
+
+            if alarm_state != 'ALARM':
+                return _response(200, {'message': 'Alarm state is not ALARM, no action taken'})
+
+            config = self.get_feature_flag_configuration()
+            if not config or not config.get('flags') or not config['flags'].get(flag_name):
+                logger.error('Feature flag %s not found in configuration', flag_name)
+                return _response(404, {'error': 'Feature flag not found'})
+
+            self.rollback_feature_flag(flag_name, config)
+            self.send_rollback_notification(flag_name, alarm_reason)
+            self.log_rollback_metrics(flag_name)
+            return _response(200, {
+                'message': f'Successfully rolled back feature flag: {flag_name}',
+                'timestamp': _iso(self.clock.datetime()),
+            })
+        except Exception as error:
+            logger.error('Error in rollback function: %s', error)
+            self.send_error_notification(str(error))
+            return _response(500, {'error': 'Rollback failed', 'message': str(error)})
+
+    def get_feature_flag_configuration(self):
+        client_id = f'rollback-lambda-{int(self.clock.datetime().timestamp() * 1000)}'
+        result = self.appconfig.get_configuration(ClientId=client_id)
+        return json.loads(result['Content']) if result.get('Content') else None
+
+    def rollback_feature_flag(self, flag_name, config):
+        now = self.clock.datetime()
+        flag = config['flags'][flag_name]
+        flag['enabled'] = False
+        flag['rolloutPercentage'] = 0
+        # A flag without metadata fails here exactly as the JS does
+        flag['metadata']['lastRollback'] = _iso(now)
+        flag['metadata']['rollbackReason'] = ROLLBACK_REASON
+        config['version'] = generate_version(now)
+        config['lastUpdated'] = _iso(now)
+
+        version = self.appconfig.create_hosted_configuration_version(
+            Content=json.dumps(config),
+            ContentType='application/json',
+            Description=f'Automated rollback of {flag_name} due to alarm',
+        )
+        self.appconfig.start_deployment(
+            ConfigurationVersion=str(version['VersionNumber']),
+            DeploymentStrategyId='AppConfig.AllAtOnce',
+            Description=f'Emergency rollback of {flag_name}',
+        )
+
+    def send_rollback_notification(self, flag_name, reason):
+        now = _iso(self.clock.datetime())
+        message = {
+            'subject': f'Feature Flag Rollback: {flag_name}',
+            'message': f'Feature flag "{flag_name}" has been automatically rolled back due to alarm.\n\n'
+                       f'Reason: {reason}\n\nTime: {now}\n\nPlease investigate and take appropriate action.',
+            'flagName': flag_name,
+            'timestamp': now,
+            'action': 'rollback',
+        }
+        try:
+            self.sns.publish(TopicArn=self.topic_arn, Message=json.dumps(message), Subject=message['subject'])
+        except Exception as error:
+            logger.error('Error sending rollback notification: %s', error)
+
+    def send_error_notification(self, error_message):
+        now = _iso(self.clock.datetime())
+        message = {
+            'subject': 'Feature Flag Rollback Failed',
+            'message': f'Automated rollback failed with error: {error_message}\n\nTime: {now}\n\n'
+                       'Please investigate immediately.',
+            'timestamp': now,
+            'action': 'rollback_failed',
+        }
+        try:
+            self.sns.publish(TopicArn=self.topic_arn, Message=json.dumps(message), Subject=message['subject'])
+        except Exception as error:
+            logger.error('Error sending error notification: %s', error)
+
+    def log_rollback_metrics(self, flag_name):
+        try:
+            self.cloudwatch.put_metric_data(Namespace=NAMESPACE, MetricData=[
+                _datum('AutomatedRollback', 1, 'Count', self.clock.datetime(), FeatureFlagName=flag_name),
+            ])
+        except Exception as error:
+            logger.error('Error logging rollback metrics: %s', error)
+
+
+def update_rollout_percentage(appconfig, cloudwatch, clock, flag_name, percentage):
+    """Port of updateRolloutPercentage through updateFeatureFlagConfiguration.
+
+    As in backend/src/services, the new version pins LatestVersionNumber to 1
+    and is deployed with Linear20PercentEvery6Minutes. AppConfig failures are
+    logged and swallowed. Returns the deployment, or None when it failed.
+    """
+    # The backend's cache is the last version it wrote
+    document = json.loads(appconfig.get_hosted_configuration_version(VersionNumber=appconfig.latest_version)['Content'])
+    flag = (document.get('flags') or {}).get(flag_name)
+    if not flag:
+        raise KeyError(f"Feature flag '{flag_name}' not found")
+    if percentage < 0 or percentage > 100:
+        raise ValueError('Rollout percentage must be between 0 and 100')
+
+    now = _iso(clock.datetime())
+    flag['rolloutPercentage'] = percentage
+    flag['metadata'] = {**flag.get('metadata', {}), 'lastUpdated': now}
+    document['version'] = generate_version(clock.datetime())
+    document['lastUpdated'] = now
+
+    try:
+        version = appconfig.create_hosted_configuration_version(
+            ConfigurationVersion='1',
+            Content=json.dumps(document),
+            ContentType='application/json',
+            Description=f'Updated at {now}',
+            LatestVersionNumber=1,
+        )
+        deployment = appconfig.start_deployment(
+            ConfigurationVersion=str(version['VersionNumber']),
+            DeploymentStrategyId='AppConfig.Linear20PercentEvery6Minutes',
+            Description='Automated feature flag update',
+        )
+    except Exception as error:
+        logger.warning('[%7.1fs] Failed to update feature flag configuration: %s', clock(), error)
+        return None
+    cloudwatch.put_metric_data(Namespace=NAMESPACE, MetricData=[
+        _datum('RolloutPercentageUpdate', percentage, 'Percent', clock.datetime(), FeatureFlagName=flag_name),
+    ])
+    return deployment
+
+
+class AppNode:
+    """One application instance: an AppConfig client, a FlagEvaluator and its metrics.
+
+    Besides the evaluation metrics of its MetricsAggregator, a node publishes
+    what sendAggregatedMetrics does (TotalRequests, TotalErrors, ErrorRate).
+    It also publishes an ErrorRate per watched flag with the FeatureFlagName
+    dimension the per-flag alarms select on.
+    """
+
+    def __init__(self, name, appconfig, sink, clock, watched_flags=(), snapshot_path=None):
+        self.name = name
+        self.appconfig = appconfig
+        self.sink = sink
+        self.clock = clock
+        self.snapshot_path = snapshot_path
+        self.metrics = MetricsAggregator(sink)
+        self.evaluator = None
+        self.version = None
+        self.evaluations = 0
+        self.flushed_evaluations = 0
+        self.requests = 0
+        self.errors = 0
+        self.flag_requests = {flag: [0, 0] for flag in watched_flags}
+
+    def poll(self):
+        """Pick up a newly deployed configuration; returns True when it changed."""
+        result = self.appconfig.get_configuration(ClientId=self.name)
+        if result['ConfigurationVersion'] == self.version:
+            return False
+        document = json.loads(result['Content'])
+        if self.snapshot_path is not None:
+            from .snapshot import FlagSnapshot, write_snapshot
+            write_snapshot(document, self.snapshot_path)
+            self.evaluator = FlagSnapshot(self.snapshot_path, self.metrics)
+        else:
+            self.evaluator = FlagEvaluator(document, self.metrics)
+        self.version = result['ConfigurationVersion']
+        return True
+
+    def record(self, results, failed):
+        self.evaluations += len(results)
+        if failed:
+            self.errors += 1
+        else:
+            self.requests += 1
+        for flag, counts in self.flag_requests.items():
+            result = results.get(flag)
+            if result is not None and result['enabled']:
+                counts[failed] += 1
+
+    def flush(self):
+        """Publish both metric sets; returns the evaluations that were waiting."""
+        timestamp = self.clock.datetime()
+        pending = self.evaluations - self.flushed_evaluations
+        self.flushed_evaluations = self.evaluations
+        self.metrics.flush(timestamp)
+
+        datums = []
+        if self.requests or self.errors:
+            datums.append(_datum('TotalRequests', self.requests, 'Count', timestamp))
+            datums.append(_datum('TotalErrors', self.errors, 'Count', timestamp))
+            datums.append(_datum('ErrorRate', self.errors / (self.requests + self.errors) * 100, 'Percent',
+                                 timestamp))
+        for flag, (ok, failed) in self.flag_requests.items():
+            if ok or failed:
+                datums.append(_datum('ErrorRate', failed / (ok + failed) * 100, 'Percent', timestamp,
+                                     FeatureFlagName=flag))
+        for start in range(0, len(datums), MAX_DATUMS_PER_CALL):
+            self.sink({'Namespace': NAMESPACE, 'MetricData': datums[start:start + MAX_DATUMS_PER_CALL]})
+        self.requests = self.errors = 0
+        self.flag_requests = {flag: [0, 0] for flag in self.flag_requests}
+        return pending
+
+
+def _simulated_flag(name, rollout, created_at):
+    return {
+        'enabled': True,
+        'rolloutPercentage': rollout,
+        'targeting': {'userGroups': [], 'userIds': []},
+        'variants': [{'name': 'control', 'weight': 50}, {'name': 'treatment', 'weight': 50}],
+        'metadata': {'description': 'Simulated flag', 'owner': 'simulator', 'createdAt': created_at},
+    }
+
+
+def synthetic_document(document, count, seed=0, created_at=None):
+    """document plus count generated flags with mixed rollouts, targeting and variants."""
+    rng = random.Random(seed)
+    created_at = created_at or _iso(datetime.datetime.now(datetime.timezone.utc))
+    flags = dict(document.get('flags') or {})
+    for i in range(count):
+        name = f'sim-flag-{i:04d}'
+        flag = _simulated_flag(name, rng.choice((0, 5, 10, 25, 50, 100)), created_at)
+        if rng.random() < 0.2:
+            flag['targeting']['userGroups'] = [rng.choice(('beta-users', 'premium-users', 'internal'))]
+        if rng.random() < 0.3:
+            flag['variants'].append({'name': 'treatment-b', 'weight': 25})
+        flags[name] = flag
+    return {**document, 'flags': flags}
+
+
+class Simulation:
+    """Traffic, error spikes and rollout ramps against nodes, alarms and the rollback Lambda."""
+
+    def __init__(self, document, qps=200.0, duration=1800.0, nodes=2, users=10000, spikes=(), ramps=(),
+                 baseline_error_rate=0.0, poll_interval=45.0, flush_interval=60.0, lambda_latency=1.0,
+                 put_latency=0.05, max_tps=None, alarm_script=DEFAULT_ALARM_SCRIPT, flag_error_rate=True,
+                 snapshot_dir=None, seed=0):
+        self.clock = VirtualClock()
+        self.qps = qps
+        self.duration = duration
+        self.spikes = list(spikes)
+        self.ramps = list(ramps)
+        self.baseline_error_rate = baseline_error_rate
+        self.poll_interval = poll_interval
+        self.flush_interval = flush_interval
+        self.lambda_latency = lambda_latency
+        self.random = random.Random(seed)
+
+        created_at = _iso(self.clock.datetime())
+        flags = dict(document.get('flags') or {})
+        for flag in {spike.flag for spike in self.spikes} | {ramp.flag for ramp in self.ramps}:
+            flags.setdefault(flag, _simulated_flag(flag, 100, created_at))
+        for ramp in self.ramps:
+            flags[ramp.flag] = {**flags[ramp.flag], 'rolloutPercentage': ramp.start}
+        document = {**document, 'flags': flags}
+        self.flag_names = list(flags)
+
+        self.sns = LocalSNS()
+        self.appconfig = LocalAppConfig(document, self.clock)
+        self.cloudwatch = LocalCloudWatch(self.clock, self.sns, put_latency, max_tps)
+        self.rollback = RollbackFunction(self.appconfig, self.cloudwatch, self.sns, self.clock)
+        self.sns.subscribe(TOPIC_ARN, self._invoke_lambda)
+        self._install_alarms(alarm_script)
+
+        watched = [flag for flag in flags if f'FeatureFlag-{flag}-ErrorRate' in self.cloudwatch.alarms]
+        if not flag_error_rate:
+            # What backend/src/services/metrics.js publishes today: no per-flag ErrorRate
+            watched = []
+        self.nodes = [
+            AppNode(f'node-{i}', self.appconfig, self.cloudwatch, self.clock, watched,
+                    os.path.join(snapshot_dir, f'node-{i}.snapshot') if snapshot_dir else None)
+            for i in range(nodes)
+        ]
+
+        groups = sorted({group for flag in flags.values()
+                         for group in ((flag.get('targeting') or {}).get('userGroups') or ())})
+        self.users = [
+            (f'user-{i}', frozenset(group for group in groups if self.random.random() < 0.3))
+            for i in range(users)
+        ]
+
+        self.invocations = []
+        self.ramp_updates = []
+        self.served_off = {}
+        self.spike_failures = collections.Counter()
+        self.requests = 0
+        self.evaluation_ns = 0
+        self.flushes = 0
+        self.flush_ns = 0
+        self.max_pending = 0
+        self._events = []
+        self._sequence = 0
+        self._next_node = 0
+
+    def _install_alarms(self, path):
+        calls = load_alarm_script(path) if path else []
+        template = None
+        for method, kwargs in calls:
+            getattr(self.cloudwatch, method)(**kwargs)
+            if template is None and ALARM_NAME_PATTERN.match(kwargs['AlarmName']):
+                template = kwargs
+        for flag in {spike.flag for spike in self.spikes}:
+            name = f'FeatureFlag-{flag}-ErrorRate'
+            if name in self.cloudwatch.alarms:
+                continue
+            if template is None:
+                logger.warning('No per-flag alarm to copy for %s; it cannot be rolled back', flag)
+                continue
+            # Same thresholds as the per-flag alarms of the setup script
+            self.cloudwatch.put_metric_alarm(**{
+                **template,
+                'AlarmName': name,
+                'Dimensions': [{'Name': 'FeatureFlagName', 'Value': flag}],
+            })
+
+    def schedule(self, at, action):
+        heapq.heappush(self._events, (at, self._sequence, action))
+        self._sequence += 1
+
+    def every(self, interval, action, first):
+        def repeat():
+            action()
+            self.schedule(self.clock() + interval, repeat)
+        self.schedule(first, repeat)
+
+    def _run_events(self, until):
+        while self._events and self._events[0][0] <= until:
+            at, _, action = heapq.heappop(self._events)
+            self.clock.now = at
+            action()
+
+    def _invoke_lambda(self, event):
+        message = json.loads(event['Records'][0]['Sns']['Message'])
+        if 'AlarmName' not in message:
+            return  # the Lambda's own notifications
+
+        def invoke():
+            response = self.rollback.handler(event)
+            logger.info('[%7.1fs] Lambda: %s -> %d %s', self.clock(), message['AlarmName'],
+                        response['statusCode'], response['body'])
+            self.invocations.append({'at': self.clock(), 'alarm': message['AlarmName'], **response})
+
+        self.schedule(self.clock() + self.lambda_latency, invoke)
+
+    def _poll(self, node):
+        node.poll()
+        for invocation in self.invocations:
+            flag = extract_feature_flag_name(invocation['alarm'])
+            if invocation['statusCode'] != 200 or flag is None or flag in self.served_off:
+                continue
+            if all(n.evaluator.flags.get(flag) is None or not n.evaluator.flags[flag].enabled for n in self.nodes):
+                self.served_off[flag] = self.clock()
+                logger.info('[%7.1fs] All nodes serve %s disabled', self.clock(), flag)
+
+    def _flush(self, node):
+        start = time.perf_counter_ns()
+        self.max_pending = max(self.max_pending, node.flush())
+        self.flush_ns += time.perf_counter_ns() - start
+        self.flushes += 1
+
+    def _ramp(self, ramp, percentage):
+        def step():
+            deployment = update_rollout_percentage(self.appconfig, self.cloudwatch, self.clock, ramp.flag, percentage)
+            self.ramp_updates.append({'at': self.clock(), 'flag': ramp.flag, 'percentage': percentage,
+                                      'deployed': deployment is not None})
+        return step
+
+    def _traffic(self, count):
+        now = self.clock()
+        active = [spike for spike in self.spikes if spike.start <= now < spike.end]
+        rng = self.random
+        users = self.users
+        nodes = self.nodes
+        names = self.flag_names
+        baseline = self.baseline_error_rate
+        clock = time.perf_counter_ns
+        elapsed = 0
+        for _ in range(count):
+            node = nodes[self._next_node % len(nodes)]
+            self._next_node += 1
+            user_id, groups = users[rng.randrange(len(users))]
+            start = clock()
+            results = node.evaluator.evaluate_many(names, user_id, groups)
+            elapsed += clock() - start
+            failed = rng.random() < baseline
+            for spike in active:
+                if results[spike.flag]['enabled'] and rng.random() < spike.rate:
+                    failed = True
+                    self.spike_failures[spike] += 1
+            node.record(results, failed)
+        self.evaluation_ns += elapsed
+        self.requests += count
+
+    def run(self):
+        wall = time.perf_counter()
+        count = len(self.nodes)
+        for i, node in enumerate(self.nodes):
+            node.poll()
+            self.every(self.poll_interval, lambda node=node: self._poll(node), self.poll_interval * (i + 1) / count)
+            self.every(self.flush_interval, lambda node=node: self._flush(node), self.flush_interval * (i + 1) / count)
+        self.every(ALARM_EVALUATION_INTERVAL, self.cloudwatch.evaluate_alarms, ALARM_EVALUATION_INTERVAL)
+        for ramp in self.ramps:
+            percentage, at = ramp.start, 0
+            while percentage < 100:
+                percentage, at = min(100.0, percentage + ramp.step), at + ramp.every
+                self.schedule(at, self._ramp(ramp, percentage))
+
+        second = 0.0
+        carry = 0.0
+        while second < self.duration:
+            self._run_events(second)
+            self.clock.now = second
+            carry += self.qps
+            self._traffic(int(carry))
+            carry -= int(carry)
+            second += 1
+        self._run_events(self.duration)
+        self.clock.now = self.duration
+        for node in self.nodes:
+            self._flush(node)
+        return self.report(time.perf_counter() - wall)
+
+    def report(self, wall_seconds=None):
+        evaluations = sum(node.evaluations for node in self.nodes)
+        evaluation_seconds = self.evaluation_ns / 1e9
+        max_rps = self.requests / evaluation_seconds if evaluation_seconds else 0.0
+
+        rollbacks = []
+        for spike in self.spikes:
+            alarm = self.cloudwatch.alarms.get(f'FeatureFlag-{spike.flag}-ErrorRate')
+            alarm_at = next((t['at'] for t in (alarm.transitions if alarm else ())
+                             if t['state'] == 'ALARM' and t['at'] >= spike.start), None)
+            invocation = next((i for i in self.invocations if alarm_at is not None
+                               and i['alarm'] == alarm.name and i['at'] >= alarm_at), None)
+            served_off = self.served_off.get(spike.flag)
+            rollbacks.append({
+                'flag': spike.flag,
+                'spikeStart': spike.start,
+                'spikeEnd': spike.end,
+                'errorRate': spike.rate,
+                'failedRequests': self.spike_failures[spike],
+                'alarmAt': alarm_at,
+                'lambdaStatus': invocation['statusCode'] if invocation else None,
+                'rolledBackAt': invocation['at'] if invocation and invocation['statusCode'] == 200 else None,
+                'servedOffAt': served_off,
+                'timeToRollback': served_off - spike.start if served_off is not None else None,
+            })
+
+        return {
+            'config': {
+                'qps': self.qps,
+                'durationSeconds': self.duration,
+                'nodes': len(self.nodes),
+                'flags': len(self.flag_names),
+                'users': len(self.users),
+                'pollInterval': self.poll_interval,
+                'flushInterval': self.flush_interval,
+            },
+            'wallSeconds': wall_seconds,
+            'throughput': {
+                'requests': self.requests,
+                'evaluations': evaluations,
+                'evaluationSeconds': evaluation_seconds,
+                'evaluationsPerSecond': evaluations / evaluation_seconds if evaluation_seconds else 0.0,
+                'maxRequestsPerSecond': max_rps,
+                'headroom': max_rps / self.qps if self.qps else None,
+            },
+            'metrics': {
+                'flushes': self.flushes,
+                'flushSeconds': self.flush_ns / 1e9,
+                'putMetricDataCalls': self.cloudwatch.calls,
+                'datums': self.cloudwatch.datums,
+                'maxPendingEvaluations': self.max_pending,
+                'maxIngestionLagSeconds': self.cloudwatch.max_lag,
+            },
+            'deployments': [
+                {
+                    'number': d['DeploymentNumber'],
+                    'version': d['ConfigurationVersion'],
+                    'strategy': d['DeploymentStrategyId'],
+                    'startedAt': d['StartedAt'],
+                    'description': d['Description'],
+                    'state': self.appconfig.deployment_state(d),
+                }
+                for d in self.appconfig.deployments
+            ],
+            'alarms': [
+                {'name': alarm.name, 'state': alarm.state, 'transitions': alarm.transitions}
+                for alarm in self.cloudwatch.alarms.values()
+            ],
+            'lambdaInvocations': self.invocations,
+            'rampUpdates': self.ramp_updates,
+            'rollbacks': rollbacks,
+        }
+
+
+def _spike(value):
+    try:
+        flag, start, end, rate = value.rsplit(':', 3)
+        return Spike(flag, float(start), float(end), float(rate))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f'expected FLAG:START:END:RATE, got {value!r}')
+
+
+def _ramp(value):
+    try:
+        flag, start, step, every = value.rsplit(':', 3)
+        return Ramp(flag, float(start), float(step), float(every))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f'expected FLAG:START:STEP:EVERY, got {value!r}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Simulate traffic, error spikes and automated rollback offline')
+    parser.add_argument('--flags', default=DEFAULT_FLAGS_FILE, help='feature-flags.json to start from')
+    parser.add_argument('--synthetic-flags', type=int, default=0, help='Generated flags added to the document')
+    parser.add_argument('--qps', type=float, default=200.0, help='Requests per virtual second')
+    parser.add_argument('--duration', type=float, default=1800.0, help='Virtual seconds to simulate')
+    parser.add_argument('--nodes', type=int, default=2, help='Application nodes sharing the traffic')
+    parser.add_argument('--users', type=int, default=10000, help='Distinct synthetic users')
+    parser.add_argument('--spike', type=_spike, action='append', default=[], metavar='FLAG:START:END:RATE',
+                        help='Fail requests that see FLAG enabled with probability RATE between START and END')
+    parser.add_argument('--ramp', type=_ramp, action='append', default=[], metavar='FLAG:START:STEP:EVERY',
+                        help='Raise the rollout of FLAG from START by STEP percent every EVERY seconds')
+    parser.add_argument('--baseline-error-rate', type=float, default=0.0, help='Error probability of any request')
+    parser.add_argument('--poll-interval', type=float, default=45.0, help='Seconds between AppConfig polls')
+    parser.add_argument('--flush-interval', type=float, default=60.0, help='Seconds between metric flushes')
+    parser.add_argument('--lambda-latency', type=float, default=1.0, help='Seconds from alarm to Lambda run')
+    parser.add_argument('--put-latency', type=float, default=0.05, help='Seconds per PutMetricData call')
+    parser.add_argument('--max-tps', type=float, help='PutMetricData calls per second before calls queue')
+    parser.add_argument('--alarm-script', default=DEFAULT_ALARM_SCRIPT, help='Script whose alarms to create')
+    parser.add_argument('--no-flag-error-rate', action='store_true',
+                        help='Publish only the global ErrorRate, as the Node backend does')
+    parser.add_argument('--snapshot-dir', help='Evaluate through memory-mapped snapshots written here')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='Write the JSON report here instead of stdout')
+    parser.add_argument('--verbose', action='store_true', help='Log every simulated event')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING,
+                        format='%(asctime)s %(levelname)s %(message)s')
+    document = load_flags(args.flags)
+    if args.synthetic_flags:
+        document = synthetic_document(document, args.synthetic_flags, args.seed)
+    if args.snapshot_dir:
+        os.makedirs(args.snapshot_dir, exist_ok=True)
+    simulation = Simulation(
+        document, args.qps, args.duration, args.nodes, args.users, args.spike, args.ramp,
+        args.baseline_error_rate, args.poll_interval, args.flush_interval, args.lambda_latency,
+        args.put_latency, args.max_tps, args.alarm_script, not args.no_flag_error_rate, args.snapshot_dir,
+        args.seed,
+    )
+    report = json.dumps(simulation.run(), ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(report + '\n')
+    else:
+        print(report)
+
+
+if __name__ == '__main__':
+    main()
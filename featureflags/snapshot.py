@@ -0,0 +1,457 @@
+"""Binary flag snapshots shared by worker processes through a read-only memory map.
+
+A single sidecar (SnapshotPoller) watches the backend or feature-flags.json and
+rewrites the snapshot file only when the document's version/lastUpdated change;
+every worker maps the file with SnapshotReader and evaluates flags in place.
+
+File layout (little endian, offsets are from the start of the file):
+
+    header      HEADER
+    metadata    JSON {"version", "lastUpdated"}
+    strings     UTF-8 flag names, user ids, groups and variant names
+    per flag    cumulative weights (f64), variant name refs (u32 off, u32 len),
+                user id hashes (u32, sorted) + refs, group hashes + refs, RECORD
+    slots       open-addressed table of RECORD offsets keyed by string_hash(name)
+"""
+
+import argparse
+import bisect
+import json
+import logging
+import mmap
+import os
+import struct
+import tempfile
+import time
+import urllib.error
+import urllib.request
+from collections.abc import Mapping
+
+from .evaluator import DEFAULT_FLAGS_FILE, CompiledFlag, FlagEvaluator, load_flags, string_hash
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SNAPSHOT_FILE = os.path.join(tempfile.gettempdir(), 'feature-flags.snapshot')
+DEFAULT_API_URL = 'http://localhost:3000/api/feature-flags'
+
+MAGIC = b'FFSNAP\x00\x00'
+FORMAT_VERSION = 1
+# magic, format, flag count, slot count, slots offset, metadata offset, metadata length, file size
+HEADER = struct.Struct('<8sIIIIIII4x')
+# name off/len, rollout, total weight, rollout/variant salt params, user ids, groups,
+# cumulative weights, variant names, enabled, has groups, linear variants
+RECORD = struct.Struct('<IIddIIIIIIIIIIIBBBx')
+REF = struct.Struct('<II')
+
+
+def _encode(text):
+    return str(text).encode('utf-8', 'surrogatepass')
+
+
+def _number(value):
+    # JSON does not distinguish 50 from 50.0; give integral values back as int
+    return int(value) if value.is_integer() else value
+
+
+def _align(out, size=8):
+    out.extend(b'\x00' * (-len(out) % size))
+
+
+def build_snapshot(document):
+    """Serialize a feature-flags.json document into snapshot bytes."""
+    flags = list(FlagEvaluator(document).flags.values())
+    out = bytearray(HEADER.size)
+
+    meta = json.dumps({'version': document.get('version'), 'lastUpdated': document.get('lastUpdated')}).encode('utf-8')
+    meta_offset = len(out)
+    out.extend(meta)
+
+    strings = {}
+
+    def intern(text):
+        ref = strings.get(text)
+        if ref is None:
+            data = _encode(text)
+            ref = strings[text] = (len(out), len(data))
+            out.extend(data)
+        return ref
+
+    for flag in flags:
+        for text in (flag.name, *flag.user_ids, *(flag.user_groups or ()), *flag.variant_names):
+            intern(text)
+
+    def string_set(values):
+        # Hashes sorted for bisect, followed by the matching string refs
+        entries = sorted((string_hash(str(value)), strings[value]) for value in values)
+        offset = len(out)
+        out.extend(struct.pack(f'<{len(entries)}I', *(h for h, _ in entries)))
+        for _, ref in entries:
+            out.extend(REF.pack(*ref))
+        return offset, len(entries)
+
+    records = []
+    for flag in flags:
+        _align(out)
+        weights_offset = len(out)
+        out.extend(struct.pack(f'<{len(flag.cumulative_weights)}d', *flag.cumulative_weights))
+        names_offset = len(out)
+        for name in flag.variant_names:
+            out.extend(REF.pack(*strings[name]))
+        ids_offset, ids_count = string_set(flag.user_ids)
+        groups_offset, groups_count = string_set(flag.user_groups or ())
+
+        _align(out)
+        records.append((flag.name, len(out)))
+        out.extend(RECORD.pack(
+            *strings[flag.name], float(flag.rollout_percentage), float(flag.total_weight),
+            flag.rollout_mult, flag.rollout_add, flag.variant_mult, flag.variant_add,
+            ids_offset, ids_count, groups_offset, groups_count,
+            weights_offset, len(flag.variant_names), names_offset,
+            flag.enabled, flag.user_groups is not None, flag.linear_variants,
+        ))
+
+    slot_count = 1
+    while slot_count < 2 * len(records):
+        slot_count *= 2
+    slots = [0] * slot_count
+    for name, offset in records:
+        i = string_hash(name) & (slot_count - 1)
+        while slots[i]:
+            i = (i + 1) & (slot_count - 1)
+        slots[i] = offset
+
+    _align(out)
+    slots_offset = len(out)
+    out.extend(struct.pack(f'<{slot_count}I', *slots))
+    HEADER.pack_into(out, 0, MAGIC, FORMAT_VERSION, len(records), slot_count,
+                     slots_offset, meta_offset, len(meta), len(out))
+    return bytes(out)
+
+
+def write_snapshot(document, path=DEFAULT_SNAPSHOT_FILE):
+    """Atomically replace the snapshot at path; open readers keep their old mapping."""
+    data = build_snapshot(document)
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.snapshot-')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    return len(data)
+
+
+class MappedStringSet:
+    """Read-only set of strings stored as sorted hashes plus UTF-8 refs inside the map."""
+
+    __slots__ = ('_buf', '_hashes', '_refs')
+
+    def __init__(self, buf, offset, count):
+        self._buf = buf
+        self._hashes = buf[offset:offset + 4 * count].cast('I')
+        self._refs = buf[offset + 4 * count:offset + 12 * count]
+
+    def __len__(self):
+        return len(self._hashes)
+
+    def _string(self, i):
+        offset, length = REF.unpack_from(self._refs, 8 * i)
+        return self._buf[offset:offset + length]
+
+    def __contains__(self, value):
+        if not isinstance(value, str):
+            return False
+        h = string_hash(value)
+        hashes = self._hashes
+        i = bisect.bisect_left(hashes, h)
+        if i < len(hashes) and hashes[i] == h:
+            data = _encode(value)
+            while i < len(hashes) and hashes[i] == h:
+                if self._string(i) == data:
+                    return True
+                i += 1
+        return False
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield bytes(self._string(i)).decode('utf-8', 'surrogatepass')
+
+    def isdisjoint(self, values):
+        return not any(value in self for value in values)
+
+
+class MappedFlag(CompiledFlag):
+    """A CompiledFlag whose targeting lists and weights are views into the snapshot map."""
+
+    __slots__ = ()
+
+    def __init__(self, buf, offset):
+        (name_offset, name_length, rollout, total_weight,
+         self.rollout_mult, self.rollout_add, self.variant_mult, self.variant_add,
+         ids_offset, ids_count, groups_offset, groups_count,
+         weights_offset, variant_count, names_offset,
+         enabled, has_groups, linear) = RECORD.unpack_from(buf, offset)
+
+        self.name = bytes(buf[name_offset:name_offset + name_length]).decode('utf-8', 'surrogatepass')
+        self.definition = None
+        self.enabled = bool(enabled)
+        self.rollout_percentage = _number(rollout)
+        self.user_ids = MappedStringSet(buf, ids_offset, ids_count)
+        self.user_groups = MappedStringSet(buf, groups_offset, groups_count) if has_groups else None
+        self.cumulative_weights = buf[weights_offset:weights_offset + 8 * variant_count].cast('d')
+        self.total_weight = _number(total_weight)
+        self.linear_variants = bool(linear)
+        self.variant_names = tuple(
+            bytes(buf[o:o + n]).decode('utf-8', 'surrogatepass')
+            for o, n in REF.iter_unpack(buf[names_offset:names_offset + 8 * variant_count])
+        )
+
+
+class MappedFlagTable(Mapping):
+    """Flag name -> MappedFlag, resolved through the snapshot's hash table on first use."""
+
+    def __init__(self, buf, flag_count, slot_count, slots_offset):
+        self._buf = buf
+        self._count = flag_count
+        self._slots = buf[slots_offset:slots_offset + 4 * slot_count].cast('I')
+        self._flags = {}
+
+    def _record_name(self, offset):
+        name_offset, name_length = REF.unpack_from(self._buf, offset)
+        return self._buf[name_offset:name_offset + name_length]
+
+    def __getitem__(self, name):
+        flag = self._flags.get(name)
+        if flag is not None:
+            return flag
+        if isinstance(name, str):
+            data = _encode(name)
+            mask = len(self._slots) - 1
+            i = string_hash(name) & mask
+            while self._slots[i]:
+                offset = self._slots[i]
+                if self._record_name(offset) == data:
+                    flag = self._flags[name] = MappedFlag(self._buf, offset)
+                    return flag
+                i = (i + 1) & mask
+        raise KeyError(name)
+
+    def __iter__(self):
+        # Records are written in document order, so offset order is flag order
+        for offset in sorted(filter(None, self._slots)):
+            yield bytes(self._record_name(offset)).decode('utf-8', 'surrogatepass')
+
+    def __len__(self):
+        return self._count
+
+
+class FlagSnapshot(FlagEvaluator):
+    """A FlagEvaluator over a memory-mapped snapshot file instead of a parsed document."""
+
+    def __init__(self, path=DEFAULT_SNAPSHOT_FILE, metrics=None):
+        with open(path, 'rb') as f:
+            stat = os.fstat(f.fileno())
+            if stat.st_size < HEADER.size:
+                raise ValueError(f'{path} is not a flag snapshot')
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.path = path
+        self.metrics = metrics
+        self.identity = (stat.st_dev, stat.st_ino, stat.st_mtime_ns)
+
+        buf = memoryview(self._mmap)
+        (magic, fmt, flag_count, slot_count, slots_offset,
+         meta_offset, meta_length, size) = HEADER.unpack_from(buf)
+        if magic != MAGIC or fmt != FORMAT_VERSION or size != len(buf):
+            raise ValueError(f'{path} is not a flag snapshot (format {FORMAT_VERSION})')
+
+        meta = json.loads(bytes(buf[meta_offset:meta_offset + meta_length]))
+        self.version = meta['version']
+        self.last_updated = meta['lastUpdated']
+        self.flags = MappedFlagTable(buf, flag_count, slot_count, slots_offset)
+
+
+class SnapshotReader:
+    """Per-worker handle that always evaluates against the newest published snapshot.
+
+    The file is stat()ed at most once per check_interval; after the poller swaps
+    in a new file the next call maps it, and the old mapping is released once no
+    caller still holds a reference to it.
+    """
+
+    def __init__(self, path=DEFAULT_SNAPSHOT_FILE, check_interval=1.0, metrics=None):
+        self.path = path
+        self.check_interval = check_interval
+        self.metrics = metrics
+        self._snapshot = None
+        self._next_check = 0.0
+
+    def current(self):
+        now = time.monotonic()
+        snapshot = self._snapshot
+        if snapshot is None or now >= self._next_check:
+            self._next_check = now + self.check_interval
+            stat = os.stat(self.path)
+            if snapshot is None or snapshot.identity != (stat.st_dev, stat.st_ino, stat.st_mtime_ns):
+                snapshot = self._snapshot = FlagSnapshot(self.path, self.metrics)
+                logger.info('Loaded flag snapshot version %s', snapshot.version)
+        return snapshot
+
+    def is_enabled(self, flag_name, user_id, user_groups=(), user_attributes=None):
+        return self.current().is_enabled(flag_name, user_id, user_groups, user_attributes)
+
+    def get_variant(self, flag_name, user_id, user_groups=(), user_attributes=None):
+        return self.current().get_variant(flag_name, user_id, user_groups, user_attributes)
+
+    def evaluate(self, flag_name, user_id, user_groups=(), user_attributes=None):
+        return self.current().evaluate(flag_name, user_id, user_groups, user_attributes)
+
+    def evaluate_many(self, flag_names, user_id, user_groups=(), user_attributes=None):
+        return self.current().evaluate_many(flag_names, user_id, user_groups, user_attributes)
+
+
+class FileSource:
+    """Flags from a local feature-flags.json; the probe is the file's stat identity."""
+
+    def __init__(self, path=DEFAULT_FLAGS_FILE):
+        self.path = path
+
+    def probe(self):
+        stat = os.stat(self.path)
+        return stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+    def fetch(self):
+        return load_flags(self.path)
+
+
+class HttpSource:
+    """Flags from the backend's /api/feature-flags routes.
+
+    GET / refreshes the backend from AppConfig on every call, so the cheap probe
+    is GET /stats (version plus flag counts). Both requests send If-None-Match
+    with the ETag Express returned last time and reuse the cached body on 304.
+    """
+
+    def __init__(self, base_url=DEFAULT_API_URL, timeout=10):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self._etags = {}
+        self._bodies = {}
+
+    def _get(self, path):
+        url = self.base_url + path
+        request = urllib.request.Request(url, headers={'Accept': 'application/json'})
+        if url in self._etags:
+            request.add_header('If-None-Match', self._etags[url])
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                body = json.load(response)
+                etag = response.headers.get('ETag')
+        except urllib.error.HTTPError as e:
+            if e.code == 304 and url in self._bodies:
+                return self._bodies[url]
+            raise
+        if etag:
+            self._etags[url] = etag
+            self._bodies[url] = body
+        if not body.get('success'):
+            raise RuntimeError(f"{url}: {body.get('error')}")
+        return body
+
+    def probe(self):
+        stats = dict(self._get('/stats')['data'])
+        # cacheInfo.lastUpdated moves on every backend refresh (including our own fetch)
+        cache_info = stats.pop('cacheInfo', None) or {}
+        return cache_info.get('version'), json.dumps(stats, sort_keys=True)
+
+    def fetch(self):
+        document = dict(self._get('')['data'])
+        document.pop('cacheInfo', None)
+        return document
+
+
+class SnapshotPoller:
+    """Sidecar loop that republishes the snapshot when the flag document changes.
+
+    The probe is only a hint: generateVersion() has minute resolution, so a full
+    fetch is also forced every max_age seconds, and the snapshot is rewritten only
+    when the fetched document's (version, lastUpdated) differ from the published one.
+    """
+
+    def __init__(self, source, path=DEFAULT_SNAPSHOT_FILE, interval=5.0, max_age=60.0, changelog=None):
+        self.source = source
+        # Optional ChangeLog that records the delta of every published document
+        self.changelog = changelog
+        self.path = path
+        self.interval = interval
+        self.max_age = max_age
+        self._probe = None
+        self._fetched_at = float('-inf')
+        self._published = None
+        try:
+            snapshot = FlagSnapshot(path)
+            self._published = (snapshot.version, snapshot.last_updated)
+        except (OSError, ValueError):
+            pass
+
+    def poll_once(self):
+        """Fetch and publish if needed; returns True when a new snapshot was written."""
+        probe = self.source.probe()
+        now = time.monotonic()
+        if probe == self._probe and now - self._fetched_at < self.max_age:
+            return False
+
+        document = self.source.fetch()
+        self._probe = probe
+        self._fetched_at = now
+        key = (document.get('version'), document.get('lastUpdated'))
+        if key == self._published:
+            return False
+
+        size = write_snapshot(document, self.path)
+        self._published = key
+        if self.changelog is not None:
+            self.changelog.record(document)
+        logger.info('Published flag snapshot version %s (%d bytes) to %s', key[0], size, self.path)
+        return True
+
+    def run(self):
+        while True:
+            try:
+                self.poll_once()
+            except Exception:
+                logger.exception('Flag snapshot poll failed; keeping the current snapshot')
+            time.sleep(self.interval)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Publish feature flags as a memory-mapped snapshot')
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument('--url', help=f'Backend feature flag API, e.g. {DEFAULT_API_URL}')
+    source.add_argument('--file', default=DEFAULT_FLAGS_FILE, help='feature-flags.json to watch')
+    parser.add_argument('--snapshot', default=DEFAULT_SNAPSHOT_FILE, help='Snapshot file shared with workers')
+    parser.add_argument('--interval', type=float, default=5.0, help='Seconds between probes')
+    parser.add_argument('--max-age', type=float, default=60.0, help='Force a full fetch after this many seconds')
+    parser.add_argument('--changelog', help='Directory of a ChangeLog to record each published delta in')
+    parser.add_argument('--once', action='store_true', help='Publish once and exit')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+    changelog = None
+    if args.changelog:
+        from .changelog import ChangeLog
+        changelog = ChangeLog(args.changelog)
+    poller = SnapshotPoller(HttpSource(args.url) if args.url else FileSource(args.file),
+                            args.snapshot, args.interval, args.max_age, changelog)
+    if args.once:
+        poller.poll_once()
+    else:
+        poller.run()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import io
+import os
+import re
+import shutil
+import tempfile
+import zipfile
+from xml.sax.saxutils import escape
+
+from docx.oxml.ns import nsdecls
+
+from convert_to_word import BOLD, CODE, ITALIC, BlockWriter, xml_text
+from docx_template import indent_style, load_template_bytes, style_ids
+
+DOCUMENT_PART = 'word/document.xml'
+QUOTE = {'"': '&quot;'}
+FLUSH_BYTES = 64 * 1024
+# Chiều rộng vùng nội dung của template (Letter, lề 1.25 inch), đơn vị twip
+CONTENT_WIDTH = 8640
+
+BODY_RE = re.compile(rb'^(.*?<w:body>)(.*)(</w:body>.*)$', re.S)
+SECT_PR_RE = re.compile(rb'<w:sectPr\b.*</w:sectPr>|<w:sectPr\b[^>]*/>', re.S)
+
+
+def run_xml(text, fmt=0, url=None):
+    ids = style_ids()
+    rpr = ''
+    if fmt & CODE:
+        rpr += f'<w:rStyle w:val="{ids["Inline Code"]}"/>'
+    elif url:
+        rpr += f'<w:rStyle w:val="{ids["Hyperlink"]}"/>'
+    if fmt & BOLD:
+        rpr += '<w:b/>'
+    if fmt & ITALIC:
+        rpr += '<w:i/>'
+    run = f'<w:r><w:rPr>{rpr}</w:rPr>' if rpr else '<w:r>'
+    run += f'<w:t xml:space="preserve">{escape(xml_text(text))}</w:t></w:r>'
+    if url:
+        # Field HYPERLINK không cần relationship nên fragment dùng lại được ở mọi document
+        instr = escape(xml_text(f'HYPERLINK "{url}"'), QUOTE)
+        run = f'<w:fldSimple w:instr="{instr}">{run}</w:fldSimple>'
+    return run
+
+
+def paragraph_xml(style_id, spans, align=None):
+    # spans: danh sách (text, fmt, url) do parse_inline tạo ra
+    ppr = f'<w:pStyle w:val="{style_id}"/>' if style_id else ''
+    if align:
+        ppr += f'<w:jc w:val="{align}"/>'
+    runs = ''.join(run_xml(text, fmt, url) for text, fmt, url in spans if text)
+    return f'<w:p><w:pPr>{ppr}</w:pPr>{runs}</w:p>' if ppr else f'<w:p>{runs}</w:p>'
+
+
+def table_xml(rows, header=False):
+    # Dựng XML của cả bảng trong một lần: kích thước lưới tính trước, mỗi ô một paragraph
+    cols = max((len(row) for row in rows), default=0)
+    if not cols:
+        return ''
+    width = CONTENT_WIDTH // cols
+    parts = [f'<w:tbl><w:tblPr><w:tblStyle w:val="{style_ids()["Table Grid"]}"/><w:tblW w:type="auto" w:w="0"/>'
+             '<w:tblLook w:firstColumn="1" w:firstRow="1" w:lastColumn="0" w:lastRow="0" '
+             'w:noHBand="0" w:noVBand="1" w:val="04A0"/></w:tblPr><w:tblGrid>',
+             f'<w:gridCol w:w="{width}"/>' * cols,
+             '</w:tblGrid>']
+    cell_start = f'<w:tc><w:tcPr><w:tcW w:type="dxa" w:w="{width}"/></w:tcPr>'
+    empty_cell = cell_start + '<w:p/></w:tc>'
+    for r, row in enumerate(rows):
+        is_header = header and r == 0
+        parts.append('<w:tr><w:trPr><w:tblHeader/></w:trPr>' if is_header else '<w:tr>')
+        for spans in row:
+            if is_header:
+                spans = [(text, fmt | BOLD, url) for text, fmt, url in spans]
+            parts.append(cell_start + paragraph_xml(None, spans) + '</w:tc>' if spans else empty_cell)
+        parts.append(empty_cell * (cols - len(row)))
+        parts.append('</w:tr>')
+    parts.append('</w:tbl>')
+    return ''.join(parts)
+
+
+def _split_template(data):
+    # Tách document.xml của template thành phần mở đầu, sectPr và phần kết thúc
+    match = BODY_RE.match(data)
+    head, body, tail = match.groups()
+    sect_pr = SECT_PR_RE.search(body)
+    return head, sect_pr.group(0) if sect_pr else b'', tail
+
+
+class StreamingDocxWriter(BlockWriter):
+    # Ghi word/document.xml trực tiếp vào file zip theo từng paragraph,
+    # không dựng cây python-docx nên bộ nhớ không tăng theo kích thước document
+
+    def __init__(self, path=None):
+        super().__init__()
+        # Ghi vào file tạm cạnh file đích; save() mới thay thế file đích,
+        # nên lỗi giữa chừng không để lại .docx hỏng hay xóa mất bản cũ
+        if path is None:
+            fd, self._tmp_path = tempfile.mkstemp(suffix='.docx')
+        else:
+            fd, self._tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)),
+                                                  prefix=f'.{os.path.basename(path)}.', suffix='.tmp')
+        os.close(fd)
+        self.path = path
+        self._style_ids = style_ids()
+        self._buffer = []
+        self._buffered = 0
+        self._fragment = None
+        self._zip = self._stream = None
+
+        try:
+            template = zipfile.ZipFile(io.BytesIO(load_template_bytes()))
+            self._zip = zipfile.ZipFile(self._tmp_path, 'w', zipfile.ZIP_DEFLATED)
+            for info in template.infolist():
+                if info.filename != DOCUMENT_PART:
+                    self._zip.writestr(info, template.read(info))
+            head, self._sect_pr, self._tail = _split_template(template.read(DOCUMENT_PART))
+
+            self._stream = self._zip.open(DOCUMENT_PART, 'w', force_zip64=True)
+            self._stream.write(head)
+        except BaseException:
+            self.abort()
+            raise
+
+    def _emit(self, xml):
+        self._buffer.append(xml)
+        self._buffered += len(xml)
+        if self._fragment is not None:
+            self._fragment.append(xml)
+        if self._buffered >= FLUSH_BYTES:
+            self._flush()
+
+    def _flush(self):
+        if self._buffer:
+            self._stream.write(''.join(self._buffer).encode('utf-8'))
+            self._buffer = []
+            self._buffered = 0
+
+    def write_blank(self, block):
+        self._emit('<w:p/>')
+
+    def write_heading(self, block):
+        align = 'center' if block.level == 1 else None
+        self._emit(paragraph_xml(self._style_ids[f'Heading {block.level}'], block.spans, align))
+
+    def write_list_item(self, block):
+        self._emit(paragraph_xml(self._style_ids[indent_style(block.level + 1)], block.spans))
+
+    def write_code_line(self, block):
+        self._emit(paragraph_xml(self._style_ids['Code'], [(block.text, 0, None)]))
+
+    def write_table(self, block):
+        self._emit(table_xml(block.rows, block.header))
+
+    def write_paragraph(self, block):
+        self._emit(paragraph_xml(self._style_ids['Normal Text'], block.spans))
+
+    def begin_fragment(self):
+        self._fragment = []
+
+    def end_fragment(self):
+        fragment = ''.join(self._fragment)
+        self._fragment = None
+        return f'<w:body {nsdecls("w")}>{fragment}</w:body>'.encode('utf-8')
+
+    def insert_fragment(self, fragment):
+        # Bỏ thẻ bọc <w:body ...> và ghi thẳng nội dung vào stream
+        if fragment.endswith(b'/>') and b'</w:body>' not in fragment:
+            return
+        inner = fragment[fragment.index(b'>') + 1:fragment.rindex(b'</w:body>')]
+        self._emit(inner.decode('utf-8'))
+
+    def save(self, path):
+        try:
+            self._flush()
+            self._stream.write(self._sect_pr + self._tail)
+            self._stream.close()
+            self._zip.close()
+            # mkstemp tạo file 0600; file .docx kết quả cần quyền đọc như file thường
+            os.chmod(self._tmp_path, 0o644)
+            try:
+                os.replace(self._tmp_path, path)
+            except OSError:
+                # Khác filesystem với file tạm (vd. path=None ở __init__)
+                shutil.move(self._tmp_path, path)
+        except BaseException:
+            self.abort()
+            raise
+        self.path = path
+
+    def abort(self):
+        # Đóng zip dở dang và xóa file tạm; file đích giữ nguyên như trước khi ghi
+        for close in (self._stream, self._zip):
+            if close is not None:
+                try:
+                    close.close()
+                except Exception:
+                    pass
+        if os.path.exists(self._tmp_path):
+            os.remove(self._tmp_path)
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import hashlib
+import os
+from collections import OrderedDict
+
+DEFAULT_CACHE_DIR = '.docx_cache'
+DEFAULT_MAX_ENTRIES = 1024
+
+
+def section_key(text, *config):
+    # Khóa cache = hash nội dung section + cấu hình style/renderer
+    h = hashlib.sha256()
+    for part in config:
+        h.update(str(part).encode('utf-8'))
+        h.update(b'\0')
+    h.update(text.encode('utf-8'))
+    return h.hexdigest()
+
+
+class SectionCache:
+    # Cache trên đĩa cho các fragment OOXML đã render, loại bỏ theo LRU.
+    # Thứ tự LRU được lưu bằng mtime của file nên giữ được giữa các lần chạy.
+
+    def __init__(self, directory=DEFAULT_CACHE_DIR, max_entries=DEFAULT_MAX_ENTRIES):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+
+        entries = []
+        with os.scandir(directory) as it:
+            for entry in it:
+                if entry.is_file() and entry.name.endswith('.xml'):
+                    entries.append((entry.stat().st_mtime, entry.name[:-4]))
+        entries.sort()
+        self._entries = OrderedDict((key, None) for _, key in entries)
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + '.xml')
+
+    def get(self, key):
+        if key not in self._entries:
+            self.misses += 1
+            return None
+        try:
+            with open(self._path(key), 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            del self._entries[key]
+            self.misses += 1
+            return None
+        # Đánh dấu vừa được dùng
+        self._entries.move_to_end(key)
+        os.utime(self._path(key))
+        self.hits += 1
+        return data
+
+    def put(self, key, data):
+        path = self._path(key)
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        self._entries[key] = None
+        self._entries.move_to_end(key)
+        self._evict()
+
+    def _evict(self):
+        while len(self._entries) > self.max_entries:
+            key, _ = self._entries.popitem(last=False)
+            try:
+                os.remove(self._path(key))
+            except FileNotFoundError:
+                pass
@@ -0,0 +1,30 @@
+"""featureflags.bulk against the scalar evaluator for ids the fixed-width array layout mangles."""
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from featureflags.bulk import BulkEvaluator, hash_prefixes  # noqa: E402
+from featureflags.evaluator import FlagEvaluator, string_hash  # noqa: E402
+
+USER_IDS = ['a', 'a\x00', 'a\x00\x00', '\x00', '', 'a\x00b', '😀\x00', 'user-1', 'ü\x00']
+
+
+@pytest.mark.parametrize('container', [list, tuple, lambda ids: np.array(ids, dtype=object)])
+def test_hash_prefixes_keeps_trailing_nuls(container):
+    assert hash_prefixes(container(USER_IDS)).tolist() == [string_hash(user_id) for user_id in USER_IDS]
+
+
+def test_bulk_matches_scalar_for_nul_ids():
+    document = {'flags': {
+        'rollout': {'enabled': True, 'rolloutPercentage': 50,
+                    'variants': [{'name': 'a', 'weight': 30}, {'name': 'b', 'weight': 70}]},
+        'targeted': {'enabled': True, 'rolloutPercentage': 0, 'targeting': {'userIds': ['a\x00']}},
+    }}
+    ids = [f'user-{i}\x00' for i in range(200)] + USER_IDS
+    evaluator = FlagEvaluator(document)
+    result = BulkEvaluator(evaluator).evaluate(ids)
+    for index, user_id in enumerate(ids):
+        expected = {name: evaluator.evaluate(name, user_id) for name in document['flags']}
+        assert result.for_user(index) == expected, repr(user_id)
+    assert result.user_ids.tolist() == ids
@@ -0,0 +1,54 @@
+"""ChangeLog deltas and ChangeSubscriber catch-up."""
+
+import copy
+
+import pytest
+
+from featureflags.changelog import ChangeLog, ChangeSubscriber
+
+DOCUMENT = {
+    'version': '1',
+    'lastUpdated': '2025-07-12T15:50:00.000Z',
+    'flags': {
+        'checkout': {'enabled': True, 'rolloutPercentage': 100, 'targeting': {'userIds': ['u1']}},
+    },
+}
+
+
+def _updated(document, version, **flag):
+    document = copy.deepcopy(document)
+    document['version'] = version
+    document['flags']['checkout'].update(flag)
+    return document
+
+
+@pytest.mark.parametrize('directory', [False, True])
+def test_subscriber_started_before_first_record(tmp_path, directory):
+    log = ChangeLog(str(tmp_path) if directory else None)
+    subscriber = ChangeSubscriber(log.changes_since)
+    assert subscriber.poll() is False
+    assert subscriber.document is None
+
+    log.record(DOCUMENT)
+    assert subscriber.poll() is True
+    assert subscriber.document == DOCUMENT
+    assert subscriber.evaluator.is_enabled('checkout', 'u2')
+
+    second = _updated(DOCUMENT, '2', enabled=False)
+    log.record(second)
+    assert subscriber.poll() is True
+    assert subscriber.document == second
+    assert 'changes' in log.changes_since(subscriber.seq - 1, subscriber.epoch)
+    assert not subscriber.evaluator.is_enabled('checkout', 'u2')
+
+
+def test_reader_process_sees_base_epoch(tmp_path):
+    writer = ChangeLog(str(tmp_path))
+    subscriber = ChangeSubscriber(ChangeLog(str(tmp_path)).changes_since)
+    subscriber.poll()
+
+    writer.record(DOCUMENT)
+    writer.record(_updated(DOCUMENT, '2', rolloutPercentage=10))
+    assert subscriber.poll() is True
+    assert subscriber.document == writer.document
+    assert subscriber.epoch == writer.epoch
@@ -0,0 +1,111 @@
+"""Bit-for-bit parity of featureflags.evaluator and featureflags.bulk with the Node.js service.
+
+The vectors come from hashUserId and getFeatureVariant in
+backend/src/services/featureFlags.js, run under node with its AWS, uuid and
+lodash dependencies stubbed out.
+"""
+
+import json
+import os
+import shutil
+import subprocess
+
+import pytest
+
+from featureflags.evaluator import FlagEvaluator, hash_user_id
+
+SERVICE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                       'backend', 'src', 'services', 'featureFlags.js')
+
+NODE_SCRIPT = r"""
+const fs = require('fs');
+const vm = require('vm');
+const input = JSON.parse(fs.readFileSync(0, 'utf8'));
+const stubs = {
+  './aws': {sendMetric() {}, getFeatureFlagConfiguration() {}, updateFeatureFlagConfiguration() {}},
+  uuid: {v4() { return ''; }},
+  lodash: {},
+};
+const context = {require: (name) => stubs[name], module: {exports: {}}, console: {log() {}, warn() {}, error() {}}};
+vm.createContext(context);
+vm.runInContext(fs.readFileSync(input.service, 'utf8'), context);
+// Top-level let bindings are shared by every script run in the same context
+vm.runInContext('featureFlagsCache = ' + JSON.stringify(input.document), context);
+const out = {hashes: [], variants: {}};
+for (const [userId, salt] of input.hashes) {
+  out.hashes.push(context.hashUserId(userId, salt));
+}
+for (const flagName of Object.keys(input.document.flags)) {
+  out.variants[flagName] = input.users.map((userId) => context.getFeatureVariant(flagName, userId));
+}
+process.stdout.write(JSON.stringify(out));
+"""
+
+USERS = (
+    [f'user-{i}' for i in range(500)]
+    + ['', 'ü', 'Zoë', 'naïve-ß', '用户-42', 'ユーザー', '😀', 'a😀b', '𝔘𝔫𝔦𝔠𝔬𝔡𝔢', '👩‍👩‍👧']
+    + ['a\x00', '\x00', 'a\x00b', '😀\x00\x00']
+)
+
+
+def _flag(*weights):
+    variants = [{'name': f'v{i}', 'weight': weight} for i, weight in enumerate(weights)]
+    return {'enabled': True, 'rolloutPercentage': 100, 'variants': variants}
+
+
+DOCUMENT = {
+    'version': 'test',
+    'flags': {
+        'even': _flag(50, 50),
+        'uneven': _flag(10, 20, 70),
+        'floats': _flag(33.3, 66.7),
+        'negative-total': _flag(50, -80),
+        'negative-total-scan': _flag(-10, 30, -40),
+        'negative-total-split': _flag(-50, 60, 10, -40),
+        'negative-float-total': _flag(-12.5, 20.25, -30),
+        'negative-weight': _flag(-20, 70, 50),
+        'zero-total': _flag(10, -10),
+        'all-zero': _flag(0, 0),
+        'single': _flag(-5),
+        'none': {'enabled': True, 'rolloutPercentage': 100, 'variants': []},
+    },
+}
+
+SALTS = ('', 'even', 'even-variant', 'ü-salt', '😀')
+
+
+@pytest.fixture(scope='module')
+def js_vectors():
+    node = shutil.which('node')
+    if node is None:
+        pytest.skip('node is not installed')
+    payload = {
+        'service': SERVICE,
+        'document': DOCUMENT,
+        'users': USERS,
+        'hashes': [[user_id, salt] for user_id in USERS for salt in SALTS],
+    }
+    completed = subprocess.run([node, '-e', NODE_SCRIPT], input=json.dumps(payload), capture_output=True,
+                               text=True, encoding='utf-8', check=True)
+    return payload, json.loads(completed.stdout)
+
+
+def test_hash_user_id_matches_js(js_vectors):
+    payload, vectors = js_vectors
+    python = [hash_user_id(user_id, salt) for user_id, salt in payload['hashes']]
+    assert python == vectors['hashes']
+
+
+def test_choose_variant_matches_js(js_vectors):
+    _, vectors = js_vectors
+    evaluator = FlagEvaluator(DOCUMENT)
+    for flag_name, expected in vectors['variants'].items():
+        assert [evaluator.get_variant(flag_name, user_id) for user_id in USERS] == expected, flag_name
+
+
+def test_bulk_variants_match_js(js_vectors):
+    bulk = pytest.importorskip('featureflags.bulk')
+    _, vectors = js_vectors
+    result = bulk.BulkEvaluator(DOCUMENT).evaluate(USERS)
+    for flag_name, expected in vectors['variants'].items():
+        assert result.variants(flag_name).tolist() == expected, flag_name
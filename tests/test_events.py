@@ -0,0 +1,76 @@
+"""EventLog flushing when the dictionary fills up or a segment write fails."""
+
+import time
+
+import pytest
+
+events = pytest.importorskip('featureflags.events')
+
+START = '2025-07-12T15:00:00.000Z'
+END = '2025-07-12T16:00:00.000Z'
+TIMESTAMP = '2025-07-12T15:30:00.000Z'
+
+
+def _total(log, flag_name):
+    return sum(point['total'] for point in log.exposures(flag_name, START, END, 3600)['datapoints'])
+
+
+def test_full_dictionary_maps_new_names_to_overflow(tmp_path, monkeypatch):
+    monkeypatch.setattr(events, 'MAX_KEYS', 4)
+    log = events.EventLog(str(tmp_path))
+    for i in range(10):
+        log.record_evaluation(f'flag-{i}', 'user', 'on', timestamp=TIMESTAMP)
+    assert log.flush() == 10
+    assert log.names == ['flag-0', 'flag-1', 'flag-2', events.OVERFLOW]
+    assert _total(log, 'flag-0') == 1
+    assert _total(log, events.OVERFLOW) == 7
+    assert not log._pending
+
+
+def test_failed_write_keeps_rows_queued(tmp_path, monkeypatch):
+    log = events.EventLog(str(tmp_path))
+    for i in range(5):
+        log.record_evaluation('checkout', f'user-{i}', 'on', timestamp=TIMESTAMP)
+
+    append = events.Segment.append
+
+    def failing_append(self, columns, start, stop):
+        raise OSError('No space left on device')
+
+    monkeypatch.setattr(events.Segment, 'append', failing_append)
+    with pytest.raises(OSError):
+        log.flush()
+    assert len(log._pending) == 5
+
+    monkeypatch.setattr(events.Segment, 'append', append)
+    assert log.flush() == 5
+    assert _total(log, 'checkout') == 5
+
+
+def test_flush_thread_survives_errors(tmp_path, monkeypatch):
+    log = events.EventLog(str(tmp_path), flush_interval=0.01)
+    calls = []
+
+    def failing_flush():
+        calls.append(None)
+        raise OSError('disk error')
+
+    monkeypatch.setattr(log, 'flush', failing_flush)
+    log.start()
+    deadline = time.monotonic() + 5
+    while len(calls) < 3 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert len(calls) >= 3
+    assert log._thread.is_alive()
+    log._stop.set()
+    log._thread.join()
+
+
+def test_queue_is_bounded(tmp_path):
+    log = events.EventLog(str(tmp_path), max_pending=3)
+    for i in range(5):
+        log.record_evaluation('checkout', f'user-{i}', 'on', timestamp=TIMESTAMP)
+    log.record_results('user', {'a': {'enabled': True, 'variant': 'x'}}, timestamp=TIMESTAMP)
+    assert len(log._pending) == 3
+    assert log.dropped == 3
+    assert log.flush() == 3